@@ -0,0 +1,429 @@
+"""Headless benchmarks for PyThrust II.
+
+Run with:  python bench.py [scenario ...]
+"""
+import gc
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy"); os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("SDL_RENDER_DRIVER", "software")  # the SDL2 backend scenario must pass without a GPU
+import numpy as np
+import pygame
+import thrust
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COLLISION_LEVELS = (1, 10, 25, 50, 75, 100)
+
+class BenchmarkFailure(Exception): pass
+
+def time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat): fn()
+    return (time.perf_counter() - start) / repeat
+
+def add_random_lasers(sim, count, rng):
+    for _ in range(count):
+        laser = thrust.Laser((rng.uniform(0, thrust.SCREEN_WIDTH), rng.uniform(0, thrust.SCREEN_HEIGHT - thrust.GROUND_HEIGHT)), rng.randrange(0, 360, thrust.ROTATION_SPEED))
+        sim.lasers.add(laser); sim.all_sprites.add(laser)
+
+# --- Collisions ---
+def bench_collisions(levels=COLLISION_LEVELS, lasers=40, repeat=200, seed=1):
+    """Per-tick collision cost by level: spatial hash + analytic tests vs. the old all-pairs/mask queries."""
+    rows = []
+    for level in levels:
+        random.seed(seed); rng = random.Random(seed)
+        spawn_time = time_per_call(lambda: thrust.Simulation(level, effects=False), 5)
+        sim = thrust.Simulation(level, effects=False); add_random_lasers(sim, lasers, rng)
+        player = sim.player
+        def hashed():
+            [b for laser in sim.lasers for b in sim.beacon_hash.query(laser.rect) if thrust.laser_hits_beacon(laser, b)]
+            sim.collide_player()
+        def all_pairs():
+            pygame.sprite.groupcollide(sim.lasers, sim.beacons, False, False)
+            pygame.sprite.spritecollide(player, sim.obstacles, False, pygame.sprite.collide_mask)
+        # Sweep the ship across the playfield so it actually meets obstacles.
+        positions = [(rng.uniform(0, thrust.SCREEN_WIDTH), rng.uniform(0, thrust.SCREEN_HEIGHT - thrust.GROUND_HEIGHT)) for _ in range(repeat)]
+        def sweep(query):
+            start = time.perf_counter()
+            for pos in positions: player.rect.center = pos; query()
+            return (time.perf_counter() - start) / repeat
+        rows.append((level, len(sim.beacons), len(sim.obstacles), spawn_time, sweep(all_pairs), sweep(hashed)))
+    print(f"{'level':>5} {'beacons':>7} {'obstacles':>9} {'spawn ms':>9} {'all-pairs us':>12} {'hashed us':>10} {'speedup':>8}")
+    for level, n_beacons, n_obstacles, spawn_time, old, new in rows:
+        print(f"{level:>5} {n_beacons:>7} {n_obstacles:>9} {spawn_time * 1e3:>9.2f} {old * 1e6:>12.1f} {new * 1e6:>10.1f} {old / new:>7.1f}x")
+    return rows
+
+# --- Soak ---
+def bench_soak(levels=300, warmup_levels=20, ticks_per_level=60, max_growth=64 * 1024, seed=1):
+    """Play `levels` levels in one session and fail if memory held between levels keeps growing."""
+    sim = thrust.Simulation(1, ships=10 ** 6, seed=seed); policy = thrust.random_policy(seed)
+    tracemalloc.start(); baseline = None; start = time.perf_counter()
+    for _ in range(levels):
+        for _ in range(ticks_per_level): sim.step(policy(sim))
+        for beacon in sim.beacons.sprites(): beacon.kill(); sim.beacon_hash.remove(beacon)
+        for _ in range(thrust.SIM_HZ * 5):
+            if sim.state == thrust.LEVEL_COMPLETE: break
+            sim.step()
+        if sim.state != thrust.LEVEL_COMPLETE: raise BenchmarkFailure(f"level {sim.level} ended in state {sim.state}")
+        # Measure between levels, where only session state should be alive whatever the level number. After
+        # complete_level the next level's sprites are alive, and there are more of them every level; its own
+        # clear_level finds nothing left to drop.
+        sim.clear_level(); gc.collect()
+        held = tracemalloc.get_traced_memory()[0]
+        if sim.level == warmup_levels: baseline = held
+        sim.complete_level()
+    tracemalloc.stop(); growth = held - baseline
+    print(f"{levels} levels in {time.perf_counter() - start:.1f}s; memory between levels {baseline / 1024:.0f} KB after level {warmup_levels}, "
+          f"{held / 1024:.0f} KB after level {levels} ({growth / 1024:+.1f} KB)")
+    if growth > max_growth: raise BenchmarkFailure(f"memory grew by {growth / 1024:.0f} KB over {levels - warmup_levels} levels")
+    return growth
+
+# --- Replay ---
+def record_session(ticks, seed, ships=10 ** 4):
+    """Drive a session with a random policy, completing levels like game_loop does, and return its recording."""
+    sim = thrust.Simulation(1, ships=ships, effects=False, seed=seed); recorder = thrust.InputRecorder(); recorder.attach(sim)
+    policy = thrust.random_policy(seed, hold_ticks=6)
+    for _ in range(ticks):
+        if sim.state == thrust.LEVEL_COMPLETE: sim.complete_level()
+        if sim.state == thrust.GAME_OVER: break
+        bits = policy(sim); sim.step(bits); recorder.record(bits)
+    return recorder.replay()
+
+def bench_replay(ticks=thrust.SIM_HZ * 60 * 30, seed=1):
+    """Record half an hour of play, round-trip it through a file and fail unless replaying reproduces it exactly."""
+    replay = record_session(ticks, seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.ptr"); thrust.save_replay(replay, path); size = os.path.getsize(path); loaded = thrust.load_replay(path)
+    if loaded != replay: raise BenchmarkFailure("recording changed on a save/load round trip")
+    start = time.perf_counter(); sim = thrust.replay_simulation(loaded); elapsed = time.perf_counter() - start
+    print(f"{len(replay.inputs)} ticks ({sim.level - 1} levels completed) in {size} bytes; replayed in {elapsed:.2f}s "
+          f"({len(replay.inputs) / elapsed:.0f} steps/s, {len(replay.inputs) / thrust.SIM_HZ / elapsed:.0f}x real time)")
+    problems = thrust.check_replay(loaded, sim)
+    if problems: raise BenchmarkFailure("replay diverged: " + "; ".join(problems))
+    return elapsed
+
+# --- Batch simulator ---
+def player_state(player):
+    return (player.pos.x, player.pos.y, player.vel.x, player.vel.y, player.angle, player.fuel, player.landed, player.landing_gear_deployed)
+
+def bench_batch(ships=256, ticks=thrust.SIM_HZ * 60, batch_ships=4096, seed=1):
+    """Fly ships through BatchSimulator and one Player each on the same inputs; fail on any difference. Then time both."""
+    batch = thrust.BatchSimulator(ships, autoreset=False); players = [thrust.Player() for _ in range(ships)]
+    rng = np.random.default_rng(seed); obs = batch.observe(); landings = 0
+    for tick in range(ticks):
+        # Half the ships try to land, the rest mash keys so crashes, wraps and the speed cap get exercised too.
+        actions = np.where(np.arange(ships) % 2 == 0, thrust.landing_policy(obs, rng), rng.integers(0, 16, ships))
+        for i, player in enumerate(players):
+            if batch.done[i]: continue
+            # Simulation.step: turn, then Player.update.
+            if actions[i] & thrust.INPUT_LEFT: player.rotate(-1)
+            if actions[i] & thrust.INPUT_RIGHT: player.rotate(1)
+            player.inputs = int(actions[i]); player.update(thrust.SIM_DT)
+        obs, reward, done, info = batch.step(actions); landings += int(info["landed"].sum())
+        for i, player in enumerate(players):
+            if done[i] and not info["lost"][i]: continue
+            expected = player_state(player); actual = tuple(obs[i])
+            if expected != actual: raise BenchmarkFailure(f"tick {tick}, ship {i}: Player {expected} != batch {actual}")
+            lost = player.crashed or (player.fuel <= 0 and not player.landed)
+            if lost != bool(info["lost"][i]): raise BenchmarkFailure(f"tick {tick}, ship {i}: Player lost={lost}, batch lost={bool(info['lost'][i])}")
+    print(f"parity: {ships} ships x {ticks} ticks match Player exactly ({landings} landings, {int(batch.done.sum())} ships lost)")
+    player = players[0]; player.reset(); player.inputs = thrust.INPUT_THRUST
+    single = time_per_call(lambda: player.update(thrust.SIM_DT), 20000)
+    batch = thrust.BatchSimulator(batch_ships); actions = np.full(batch_ships, thrust.INPUT_THRUST)
+    vectorised = time_per_call(lambda: batch.step(actions), 200) / batch_ships
+    print(f"Player.update {single * 1e6:.2f} us/ship-tick; BatchSimulator({batch_ships}) {vectorised * 1e6:.3f} us/ship-tick ({single / vectorised:.0f}x)")
+    start = time.perf_counter(); sets = [thrust.ShipParams(gravity=g) for g in (0.015, 0.02, 0.025, 0.03)]
+    results = thrust.sweep(sets, ships=1024, ticks=thrust.SIM_HZ * 20, seed=seed)
+    print(f"sweep: {len(sets)} gravity settings x 1024 ships x 20 s in {time.perf_counter() - start:.1f}s on a process pool")
+    for params, (landed, lost) in zip(sets, results): print(f"  gravity {params.gravity:.3f}: {landed} landings, {lost} ships lost")
+
+# --- Scrolling worlds ---
+def bench_world(sizes=(1, 10, 100), level=5, frames=1200, max_ratio=1.5, seed=1):
+    """Step and draw scrolling worlds of growing width; fail if frame time grows with the world."""
+    rows = []
+    for screens in sizes:
+        start = time.perf_counter(); sim = thrust.Simulation(level, ships=10 ** 6, seed=seed, world_screens=screens); generate = time.perf_counter() - start
+        renderer = thrust.GameRenderer(pygame.Surface((thrust.SCREEN_WIDTH, thrust.SCREEN_HEIGHT)), thrust.Hud(pygame.Surface((10, 8))))
+        policy = thrust.random_policy(seed); times = []
+        for _ in range(frames):
+            start = time.perf_counter(); sim.step(policy(sim)); renderer.draw(sim, 0.5); times.append(time.perf_counter() - start)
+        times.sort(); rows.append((screens, len(sim.beacons) + len(sim.obstacles), generate, times[len(times) // 2], times[int(len(times) * 0.95)]))
+    print(f"{'screens':>7} {'sprites':>7} {'generate ms':>11} {'p50 frame ms':>12} {'p95 frame ms':>12}")
+    for screens, sprites, generate, p50, p95 in rows: print(f"{screens:>7} {sprites:>7} {generate * 1e3:>11.1f} {p50 * 1e3:>12.3f} {p95 * 1e3:>12.3f}")
+    ratio = rows[-1][3] / rows[0][3]
+    if ratio > max_ratio: raise BenchmarkFailure(f"median frame time is {ratio:.2f}x higher with {sizes[-1]} screens than with {sizes[0]}")
+    return rows
+
+# --- Cold start ---
+PACKAGED_BUILD = os.path.join(HERE, "dist", "thrust")  # a folder for the startup profile, a single exe for onefile
+
+def time_to_first_frame(command, runs):
+    """Median wall time from launching `command --startup-probe` until it exits after drawing the first menu frame."""
+    env = dict(os.environ, SDL_VIDEODRIVER=os.environ.get("SDL_VIDEODRIVER", "dummy"), SDL_AUDIODRIVER=os.environ.get("SDL_AUDIODRIVER", "dummy"))
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter(); subprocess.run(command + ["--startup-probe"], env=env, cwd=HERE, check=True, capture_output=True)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2], min(times)
+
+def bench_startup(runs=5):
+    """Time-to-first-menu-frame for the source run and for any PyInstaller builds found in dist/."""
+    targets = [("source", [sys.executable, os.path.join(HERE, "thrust.py")])]
+    if os.path.isdir(PACKAGED_BUILD): name, base = "packaged (startup)", os.path.join(PACKAGED_BUILD, "thrust")
+    else: name, base = "packaged (onefile)", PACKAGED_BUILD
+    exe = next((path for path in (base, base + ".exe") if os.path.isfile(path)), None)
+    if exe: targets.append((name, [exe]))
+    else: print("packaged: not built (pyinstaller thrust.spec), skipped")
+    rows = []
+    for name, command in targets:
+        median, best = time_to_first_frame(command, runs); rows.append((name, median, best))
+        print(f"{name:>20}: first menu frame after {median * 1e3:.0f} ms (best {best * 1e3:.0f} ms over {runs} launches)")
+    return rows
+
+# --- SDL2 texture backend ---
+def read_window(backend):
+    """The whole window as the renderer drew it, letterbox included."""
+    renderer = backend.renderer; renderer.logical_size = (0, 0)
+    try: return renderer.to_surface()
+    finally: renderer.logical_size = (thrust.SCREEN_WIDTH, thrust.SCREEN_HEIGHT)
+
+def frame_difference(expected, actual, tolerance=40):
+    """Fraction of pixels where any channel differs by more than tolerance."""
+    return float((np.abs(pygame.surfarray.array3d(expected).astype(np.int16) - pygame.surfarray.array3d(actual)).max(axis=2) > tolerance).mean())
+
+def bench_sdl2(window_sizes=((800, 600), (1280, 720)), frames=600, compare_every=20, max_difference=0.001, max_scaled_difference=0.03, seed=1):
+    """Draw the same frames with the software renderer and the SDL2 texture renderer (SDL's software render driver
+    unless SDL_RENDER_DRIVER says otherwise); fail if they differ, including when scaled to another window size.
+    Scaled frames get more slack: SDL and pygame.transform.scale round the edges of scaled pixels differently."""
+    screen = pygame.Surface((thrust.SCREEN_WIDTH, thrust.SCREEN_HEIGHT)); icon = pygame.Surface((10, 8))
+    print(f"SDL render driver: {os.environ.get('SDL_RENDER_DRIVER', 'default')}")
+    for size in window_sizes:
+        backend = thrust.TextureBackend(size); viewport = screen.get_rect().fit(pygame.Rect((0, 0), size))
+        for world in (None, 5):
+            sim = thrust.Simulation(10, ships=10 ** 6, seed=seed, world_screens=world); policy = thrust.random_policy(seed)
+            software = thrust.GameRenderer(screen, thrust.Hud(icon), full_redraw=True); textured = thrust.TextureRenderer(backend, thrust.Hud(icon))
+            worst = 0.0; draw_time = 0.0
+            for frame in range(frames):
+                sim.step(policy(sim))
+                if frame % 60 == 0: thrust.create_explosion(sim.player.pos, 40, sim.particles)
+                start = time.perf_counter(); textured.draw(sim, 0.5); textured.present(None); draw_time += time.perf_counter() - start
+                if frame % compare_every == 0:
+                    software.draw(sim, 0.5); expected = pygame.transform.scale(screen, viewport.size)
+                    worst = max(worst, frame_difference(expected, read_window(backend).subsurface(viewport)))
+            print(f"{size[0]}x{size[1]} {'world ' + str(world) if world else 'single screen'}: {frames / draw_time:.0f} fps drawing, "
+                  f"{len(backend.atlas.regions)} atlas regions, worst frame differs from software in {worst:.2%} of pixels")
+            if worst > (max_difference if size == screen.get_size() else max_scaled_difference): raise BenchmarkFailure(f"SDL2 frame at {size[0]}x{size[1]} differs from the software renderer in {worst:.2%} of pixels")
+            del textured
+        backend.close()
+
+# --- Snapshots ---
+def bench_snapshot(ticks=thrust.SIM_HZ * 60 * 5, resume_every=thrust.SIM_HZ * 10, check_ticks=thrust.SIM_HZ * 5,
+                   stream_levels=(1, 10, 50), stream_ticks=thrust.SIM_HZ * 60, max_bytes_per_tick=300, seed=1):
+    """Resume sessions from snapshots and fail unless they play on identically; then stream games to a spectator over a
+    local socket and fail if it reconstructs a snapshot wrongly or the stream averages over max_bytes_per_tick."""
+    for world in (None, 5):
+        sim = thrust.Simulation(1, ships=10 ** 4, effects=False, seed=seed, world_screens=world); policy = thrust.random_policy(seed, hold_ticks=6); resumes = 0
+        def step(target, bits):
+            if target.state == thrust.LEVEL_COMPLETE: target.complete_level()
+            target.step(bits)
+        while sim.tick < ticks and sim.state != thrust.GAME_OVER:
+            data = thrust.encode_snapshot(sim); copy = thrust.simulation_from_snapshot(data, effects=False)
+            if thrust.encode_snapshot(copy) != data: raise BenchmarkFailure(f"tick {sim.tick}: snapshot changed on a restore/encode round trip")
+            for _ in range(check_ticks):
+                bits = policy(sim); step(sim, bits); step(copy, bits)
+            if thrust.state_hash(copy) != thrust.state_hash(sim): raise BenchmarkFailure(f"session resumed at tick {sim.tick - check_ticks} diverged within {check_ticks} ticks")
+            for _ in range(resume_every - check_ticks): step(sim, policy(sim))
+            resumes += 1
+        print(f"{'world ' + str(world) if world else 'single screen'}: {resumes} resumes up to level {sim.level} played on identically, "
+              f"snapshots {len(data)} bytes")
+    streamer = thrust.SnapshotStreamer(0); receiver = thrust.SnapshotReceiver(streamer.port)
+    try:
+        deadline = time.perf_counter() + 5
+        while not streamer.clients:
+            if time.perf_counter() > deadline: raise BenchmarkFailure("spectator never connected")
+            time.sleep(0.01)
+        print(f"{'level':>5} {'snapshot bytes':>14} {'bytes/tick sent':>15} {'publish us':>10} {'dropped':>7}")
+        for level in stream_levels:
+            sim = thrust.Simulation(level, ships=10 ** 4, effects=False, seed=seed); policy = thrust.random_policy(seed)
+            sent_before = streamer.bytes_sent; ticks_before = streamer.ticks; dropped_before = streamer.dropped
+            expected = {}; publish_time = 0.0; received = []
+            for _ in range(stream_ticks):
+                if sim.state in (thrust.LEVEL_COMPLETE, thrust.GAME_OVER): break
+                sim.step(policy(sim)); start = time.perf_counter(); streamer.publish(sim); publish_time += time.perf_counter() - start
+                expected[sim.tick] = thrust.encode_snapshot(sim); received += receiver.poll()
+            deadline = time.perf_counter() + 5
+            while not received or received[-1] != expected[sim.tick]:
+                if time.perf_counter() > deadline: raise BenchmarkFailure(f"level {level}: the spectator never caught up with tick {sim.tick}")
+                received += receiver.poll(); time.sleep(0.001)
+            for snapshot in received:
+                if snapshot != expected.get(thrust.snapshot_header(snapshot).tick): raise BenchmarkFailure(f"level {level}: spectator rebuilt a snapshot wrongly")
+            per_tick = (streamer.bytes_sent - sent_before) / max(streamer.ticks - ticks_before, 1)
+            print(f"{level:>5} {len(expected[sim.tick]):>14} {per_tick:>15.0f} {publish_time / sim.tick * 1e6:>10.1f} {streamer.dropped - dropped_before:>7}")
+            if per_tick > max_bytes_per_tick: raise BenchmarkFailure(f"level {level}: stream averaged {per_tick:.0f} bytes per tick")
+    finally: receiver.close(); streamer.close()
+
+# --- Frame scenarios ---
+# Seeded, scripted per-frame workloads, timed frame by frame and then re-run under tracemalloc for
+# peak memory. Each is a generator that sets up on the first next() and yields once per frame.
+# Results are compared with a JSON baseline, which is written on the first run (or with
+# --update-baseline); a scenario fails when fps, p95 frame time or peak memory is more than
+# --threshold worse than its baseline.
+BASELINE_PATH = os.path.join(HERE, "bench_baseline.json")
+# Changes smaller than these are noise, however large they are relative to a tiny baseline
+BASELINE_TIME_SLACK_MS = 0.1; BASELINE_MEMORY_SLACK_KB = 64
+
+def new_screen(): return pygame.Surface((thrust.SCREEN_WIDTH, thrust.SCREEN_HEIGHT))
+
+def hud_frames(seed):
+    """The HUD with fuel and angle changing every frame and the other fields every few frames."""
+    screen = new_screen(); hud = thrust.Hud(pygame.Surface((10, 8))); rng = random.Random(seed); score = 0
+    for n in itertools.count():
+        if n % 15 == 0: score += thrust.BEACON_SCORE
+        screen.fill(thrust.BLACK)
+        hud.draw(screen, rng.uniform(0, thrust.MAX_FUEL), rng.randrange(0, 360, thrust.ROTATION_SPEED), n % 120 < 60,
+                 20 - n // 60 % 20, score, 1 + n // 600, 3 + n // 300 % 3)
+        yield
+
+def rotation_frames(seed):
+    """The ship spinning with the rotate key held, with short thrust bursts so it never settles on the ground."""
+    sim = thrust.Simulation(5, ships=10 ** 6, seed=seed); renderer = thrust.GameRenderer(new_screen(), thrust.Hud(pygame.Surface((10, 8))))
+    while True:
+        sim.step(thrust.INPUT_LEFT | (thrust.INPUT_THRUST if sim.tick % 60 < 20 else 0)); renderer.draw(sim); yield
+
+def particle_frames(seed, bursts=4):
+    """Overlapping create_explosion calls every frame around the middle of the screen, up against MAX_PARTICLES."""
+    screen = new_screen(); particles = thrust.ParticleSystem(); rng = random.Random(seed); thrust.particle_rng = np.random.default_rng(seed)
+    while True:
+        for _ in range(bursts): thrust.create_explosion((rng.uniform(300, 500), rng.uniform(200, 400)), thrust.EXPLOSION_PARTICLE_COUNT, particles)
+        particles.update(thrust.SIM_DT); screen.fill(thrust.BLACK); particles.draw(screen); yield
+
+def crowd_frames(seed, level=60, lasers=40):
+    """A level-60 field (64 beacons, 118 obstacles) with lasers flying, stepped and drawn; restarts the level when it's cleared."""
+    sim = thrust.Simulation(level, ships=10 ** 6, seed=seed); renderer = thrust.GameRenderer(new_screen(), thrust.Hud(pygame.Surface((10, 8))))
+    rng = random.Random(seed); policy = thrust.random_policy(seed)
+    while True:
+        if sim.state == thrust.LEVEL_COMPLETE: sim.start_level(level)
+        if len(sim.lasers) < lasers: add_random_lasers(sim, lasers - len(sim.lasers), rng)
+        sim.step(policy(sim)); renderer.draw(sim); yield
+
+def levelgen_frames(seed, first_level=50, levels=50):
+    """One level start per frame (layout generation and sprite building) for levels 50 to 99 in turn."""
+    sim = thrust.Simulation(first_level, effects=False, seed=seed)
+    for n in itertools.count(): sim.start_level(first_level + n % levels); yield
+
+def session_frames(seed, ticks_per_level=120):
+    """A multi-level session using the game's level cache, level transitions included.
+    The beacons left are cleared every ticks_per_level ticks so the session moves on."""
+    level_cache = thrust.LevelCache(seed); level_cache.prefetch(1)
+    try:
+        sim = thrust.Simulation(1, ships=10 ** 6, seed=seed, level_cache=level_cache); policy = thrust.random_policy(seed)
+        renderer = thrust.GameRenderer(new_screen(), thrust.Hud(pygame.Surface((10, 8))))
+        while True:
+            if sim.state == thrust.LEVEL_COMPLETE: sim.complete_level(); renderer.invalidate()
+            if sim.tick % ticks_per_level == 0:
+                for beacon in sim.beacons.sprites(): beacon.kill(); sim.beacon_hash.remove(beacon)
+                sim.static_version += 1
+            sim.step(policy(sim)); renderer.draw(sim); yield
+    finally: level_cache.close()
+
+FRAME_SCENARIOS = {"hud": hud_frames, "rotation": rotation_frames, "particles": particle_frames, "crowd": crowd_frames,
+                   "levelgen": levelgen_frames, "session": session_frames}
+
+def run_frames(scenario, seed, frames, warmup, trace=False):
+    """Per-frame times after `warmup` frames, or with trace, the traced peak memory over the whole run in bytes."""
+    if trace: gc.collect(); tracemalloc.start()
+    frame_iter = scenario(seed); times = []
+    try:
+        for _ in range(warmup): next(frame_iter)
+        for _ in range(frames): start = time.perf_counter(); next(frame_iter); times.append(time.perf_counter() - start)
+        if trace: return tracemalloc.get_traced_memory()[1]
+    finally:
+        frame_iter.close()
+        if trace: tracemalloc.stop()
+    return times
+
+def measure_frames(scenario, frames=600, warmup=60, seed=1, repeat=5):
+    """Each timing is the best of `repeat` identical runs; the slower runs mostly measure whatever else the machine was doing."""
+    runs = [sorted(run_frames(scenario, seed, frames, warmup)) for _ in range(repeat)]
+    peak = run_frames(scenario, seed, frames, warmup, trace=True)
+    def percentile(p): return min(times[min(len(times) - 1, int(len(times) * p / 100))] for times in runs) * 1e3
+    return {"frames": frames, "fps": max(frames / sum(times) for times in runs), "p50_ms": percentile(50), "p95_ms": percentile(95),
+            "p99_ms": percentile(99), "peak_kb": peak / 1024}
+
+class Baseline:
+    """Frame scenario results saved as JSON, with the environment they were measured in."""
+    def __init__(self, path=BASELINE_PATH, threshold=0.25, update=False):
+        self.path = path; self.threshold = threshold; self.update = update; self.changed = False
+        self.environment = {"python": platform.python_version(), "pygame": pygame.version.ver, "numpy": np.__version__, "machine": platform.platform()}
+        self.scenarios = {}; self.recorded_in = None
+        if os.path.exists(path):
+            with open(path) as f: data = json.load(f)
+            self.scenarios = data.get("scenarios", {}); self.recorded_in = data.get("environment")
+    def regressions(self, name, result):
+        """How `result` is worse than the baseline beyond the threshold (empty if it isn't, or there's no baseline)."""
+        previous = self.scenarios.get(name)
+        if previous is None or self.update: return []
+        def exceeds(value, base, slack): return value > max(base * (1 + self.threshold), base + slack)
+        worse = []
+        if exceeds(1e3 / result["fps"], 1e3 / previous["fps"], BASELINE_TIME_SLACK_MS): worse.append(f"{result['fps']:.0f} fps, baseline {previous['fps']:.0f}")
+        if exceeds(result["p95_ms"], previous["p95_ms"], BASELINE_TIME_SLACK_MS): worse.append(f"p95 {result['p95_ms']:.2f} ms, baseline {previous['p95_ms']:.2f}")
+        if exceeds(result["peak_kb"], previous["peak_kb"], BASELINE_MEMORY_SLACK_KB): worse.append(f"peak {result['peak_kb']:.0f} KB, baseline {previous['peak_kb']:.0f}")
+        return worse
+    def record(self, name, result):
+        if name not in self.scenarios or self.update: self.scenarios[name] = result; self.changed = True; return True
+        return False
+    def save(self):
+        if not self.changed: return
+        with open(self.path, "w") as f: json.dump({"environment": self.environment, "scenarios": self.scenarios}, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {self.path}")
+
+def bench_frames(name, baseline, frames=600, warmup=60, seed=1):
+    result = measure_frames(FRAME_SCENARIOS[name], frames, warmup, seed)
+    print(FRAME_SCENARIOS[name].__doc__.split("\n")[0])
+    print(f"{result['fps']:.0f} fps, frame ms p50 {result['p50_ms']:.3f} p95 {result['p95_ms']:.3f} p99 {result['p99_ms']:.3f}, peak memory {result['peak_kb']:.0f} KB")
+    previous = baseline.scenarios.get(name)
+    if previous is not None and not baseline.update:
+        print(f"baseline: {previous['fps']:.0f} fps, p95 {previous['p95_ms']:.3f} ms, peak {previous['peak_kb']:.0f} KB")
+    worse = baseline.regressions(name, result)
+    if worse: raise BenchmarkFailure(f"{name} regressed more than {baseline.threshold:.0%}: " + "; ".join(worse))
+    if baseline.record(name, result): print("recorded as the baseline")
+    return result
+
+SCENARIOS = {"collisions": bench_collisions, "soak": bench_soak, "replay": bench_replay, "batch": bench_batch, "world": bench_world,
+             "startup": bench_startup, "sdl2": bench_sdl2, "snapshot": bench_snapshot}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PyThrust II benchmarks")
+    names = sorted(SCENARIOS) + sorted(FRAME_SCENARIOS)
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"scenarios to run: {', '.join(names)}, or 'frames' for all of {', '.join(sorted(FRAME_SCENARIOS))} (default: all)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, metavar="PATH", help="JSON file of frame scenario baselines")
+    parser.add_argument("--update-baseline", action="store_true", help="overwrite the baselines of the frame scenarios run")
+    parser.add_argument("--threshold", type=float, default=0.25, help="fail frame scenarios more than this fraction worse than the baseline")
+    args = parser.parse_args(argv)
+    selected = [name for requested in args.scenarios for name in (sorted(FRAME_SCENARIOS) if requested == "frames" else [requested])] or names
+    unknown = [name for name in selected if name not in SCENARIOS and name not in FRAME_SCENARIOS]
+    if unknown: parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    baseline = Baseline(args.baseline, args.threshold, args.update_baseline)
+    if baseline.recorded_in and baseline.recorded_in != baseline.environment and any(name in FRAME_SCENARIOS for name in selected):
+        print(f"note: baselines were recorded on {baseline.recorded_in}; this is {baseline.environment}")
+    pygame.init(); failures = 0
+    for name in selected:
+        print(f"== {name} ==")
+        try: bench_frames(name, baseline) if name in FRAME_SCENARIOS else SCENARIOS[name]()
+        except BenchmarkFailure as e: print(f"FAIL: {e}"); failures += 1
+    pygame.quit(); baseline.save()
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,6 +3,21 @@ import math
 import sys
 import random
 import os # For path joining
+import time
+import argparse
+import csv
+import logging
+import queue
+import socket
+import tempfile
+import threading
+import struct
+import zlib
+import hashlib
+import numpy as np
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+STARTED_AT = time.perf_counter()  # imports done; --startup-probe reports the menu's first frame relative to this
 
 # --- Constants ---
 SCREEN_WIDTH = 800
@@ -52,7 +67,10 @@ SMOKE_PARTICLE_COUNT = 25; SMOKE_LIFESPAN_MIN = 0.4; SMOKE_LIFESPAN_MAX = 0.9
 SMOKE_SPEED_MIN = 0.5; SMOKE_SPEED_MAX = 2.5
 EXPLOSION_PARTICLE_COUNT = 50; EXPLOSION_LIFESPAN_MIN = 0.5; EXPLOSION_LIFESPAN_MAX = 1.2
 EXPLOSION_SPEED_MIN = 1.0; EXPLOSION_SPEED_MAX = 4.0
-DEATH_ANIM_DURATION = 1000
+MAX_PARTICLES = 2000; PARTICLE_ALPHA_LEVELS = 16
+SMOKE_COLORS = (SMOKE_COLOR_1, SMOKE_COLOR_2, SMOKE_COLOR_3)
+EXPLOSION_COLORS = (EXPLOSION_COLOR_1, EXPLOSION_COLOR_2, EXPLOSION_COLOR_3, EXPLOSION_COLOR_4)
+DEATH_ANIM_DURATION = 1000; FLAME_RADIUS = 4
 
 # Scoring & Lives (unchanged)
 INITIAL_SHIPS = 3; EXTRA_LIFE_SCORE = 1000; LEVEL_BONUS = 500
@@ -61,22 +79,126 @@ INITIAL_SHIPS = 3; EXTRA_LIFE_SCORE = 1000; LEVEL_BONUS = 500
 HIGHSCORE_FILE = "pythrust_highscores.txt"
 NUM_HIGH_SCORES = 3
 
+# End-of-level / game over overlays (ms); Enter skips them
+GAME_OVER_DURATION = 2500; LEVEL_COMPLETE_DURATION = 2000; MESSAGE_SHADE = (0, 0, 0, 180)
+
+# SDL2 renderer backend (--renderer sdl2)
+TEXTURE_ATLAS_SIZE = 1024
+
+# Frame profiler
+PROFILE_PHASES = ("events", "input", "update", "collision", "particles", "draw", "hud", "flip")
+PROFILE_HISTORY = 600; PROFILE_OVERLAY_REFRESH = 15
+
+# Input recordings: header (magic, version, seed, level, score, ships, world screens (0 = classic), ticks, final score,
+# final state hash) + zlib'd input bytes
+REPLAY_MAGIC = b"PTRR"; REPLAY_VERSION = 2
+REPLAY_HEADER = struct.Struct("<4sHIHIHHII8s")
+
 # Game states
 MENU = "MENU"; PLAYING = "PLAYING"; GAME_OVER = "GAME_OVER"
 LEVEL_COMPLETE = "LEVEL_COMPLETE"; PLAYER_EXPLODING = "PLAYER_EXPLODING"
+SIM_STATES = (PLAYING, PLAYER_EXPLODING, LEVEL_COMPLETE, GAME_OVER)
+
+# State snapshots (F5/F9, --resume, --stream): header (magic, version, seed, world screens, tick, level, score, ships,
+# next extra life, state, death animation start), player (pos, vel, rect center, angle, fuel, last shot, flags, inputs),
+# counts, then little-endian int32 obstacles (x, y, radius) and beacons (x, y), and lasers (x, y as doubles, angle)
+SNAPSHOT_MAGIC = b"PTSS"; SNAPSHOT_VERSION = 1; SAVE_FILE = "pythrust_save.bin"
+SNAPSHOT_HEADER = struct.Struct("<4sHIHIHIIIBI"); SNAPSHOT_PLAYER = struct.Struct("<ddddiiHdIBB"); SNAPSHOT_COUNTS = struct.Struct("<HHH")
+SNAPSHOT_LASER = "ddH"
+# Spectator streams: packets of (kind, payload length) + zlib'd keyframe or XOR delta against the previous snapshot
+STREAM_PORT = 47474; STREAM_PACKET = struct.Struct("<BI"); STREAM_KEYFRAME = 0; STREAM_DELTA = 1
+STREAM_QUEUE = 120; STREAM_POLL = 0.05; STREAM_SEND_TIMEOUT = 1.0
+
+# Simulation timing: physics constants above are per tick at SIM_HZ
+SIM_HZ = 60; SIM_DT = 1.0 / SIM_HZ; MAX_FRAME_TIME = 0.25
+SCREEN_RECT = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+# Input bits: one tick of player input packed into an int
+INPUT_THRUST = 1; INPUT_BOOST = 2; INPUT_LEFT = 4; INPUT_RIGHT = 8; INPUT_FIRE = 16
+
+# Collision broad phase
+SPATIAL_CELL_SIZE = 64; LASER_HIT_RADIUS = 3
+
+# Level generation
+LEVEL_AREA_HEIGHT = SCREEN_HEIGHT - GROUND_HEIGHT - BEACON_RADIUS * 4
+LEVEL_GRID_SLACK = 1.5; PLAYER_SPAWN_CLEARANCE = 20; LEVEL_CACHE_AHEAD = 2
+
+# Scrolling worlds (--world): a heightmap ground drawn from cached chunks, with a camera following the ship
+TERRAIN_CHUNK_WIDTH = 256; TERRAIN_CHUNK_CACHE = 16; TERRAIN_RELIEF = 160; TERRAIN_FEATURE = 96
+TERRAIN_PAD_WIDTH = 64; TERRAIN_PAD_SPACING = 640; TERRAIN_CLEARANCE = 10
+MAX_WORLD_SCREENS = 0xFFFF  # stored as a uint16 in replay and snapshot headers
+
+# Text rendering
+# pygame's bundled freesansbold.ttf by explicit path: no system font scan, and unlike Font(None) the size isn't
+# scaled down, so text stays the size the Arial it replaces drew it. pygame's PyInstaller hook ships the file.
+FONT_PATH = os.path.join(os.path.dirname(pygame.__file__), pygame.font.get_default_font())
+TEXT_CACHE_SIZE = 256
+
+# --- Logging ---
+# Gameplay events log at DEBUG/INFO; the default WARNING level keeps console I/O out of the frame loop.
+log = logging.getLogger("thrust")
+
+# --- Text Rendering ---
+# Fonts are opened once per size and rendered strings are kept in an LRU cache,
+# so steady HUD text costs a dict lookup instead of a render.
+_fonts = {}
+
+def get_font(size):
+    font = _fonts.get(size)
+    if font is None: font = _fonts[size] = pygame.font.Font(FONT_PATH, size)
+    return font
+
+class TextCache:
+    """LRU cache of rendered text surfaces keyed by (text, size, color)."""
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries; self.entries = OrderedDict()
+        self.hits = 0; self.misses = 0
+    def render(self, text, size, color):
+        key = (text, size, tuple(color)); text_surface = self.entries.get(key)
+        if text_surface is not None:
+            self.hits += 1; self.entries.move_to_end(key); return text_surface
+        self.misses += 1; text_surface = get_font(size).render(text, True, color)
+        self.entries[key] = text_surface
+        if len(self.entries) > self.max_entries: self.entries.popitem(last=False)
+        return text_surface
+    def stats_text(self):
+        return f"Text cache: {self.hits} hits / {self.misses} misses ({len(self.entries)}/{self.max_entries})"
+
+text_cache = TextCache()
+
+def align_rect(rect, x, y, align):
+    if align == "midtop": rect.midtop = (x, y)
+    elif align == "topleft": rect.topleft = (x, y)
+    elif align == "topright": rect.topright = (x, y)
+    return rect
+
+class HudText:
+    """A single HUD line that only re-renders when its text or color changes."""
+    def __init__(self, size, x, y, color=WHITE, align="midtop"):
+        self.size = size; self.x = x; self.y = y; self.color = color; self.align = align
+        self.text = None; self.current_color = None; self.surface = None; self.rect = pygame.Rect(x, y, 0, 0)
+        self.prev_rect = self.rect; self.changed = False
+    def set(self, text, color=None):
+        color = self.color if color is None else color
+        if text != self.text or color != self.current_color:
+            if not self.changed: self.prev_rect = self.rect
+            self.text = text; self.current_color = color; self.changed = True
+            self.surface = text_cache.render(text, self.size, color)
+            self.rect = align_rect(self.surface.get_rect(), self.x, self.y, self.align)
+    def dirty_rect(self):
+        """Screen area touched since the last draw: where the old text was plus where the new text goes."""
+        return self.prev_rect.union(self.rect)
+    def draw(self, surface):
+        if self.surface is not None: surface.blit(self.surface, self.rect)
+        self.changed = False
 
 # --- Helper Functions ---
-# (draw_text, draw_gauge unchanged)
 def draw_text(surface, text, size, x, y, color=WHITE, align="midtop"):
-    font = pygame.font.Font(pygame.font.match_font('arial'), size)
-    text_surface = font.render(text, True, color)
-    text_rect = text_surface.get_rect()
-    if align == "midtop": text_rect.midtop = (x, y)
-    elif align == "topleft": text_rect.topleft = (x, y)
-    elif align == "topright": text_rect.topright = (x, y)
-    surface.blit(text_surface, text_rect)
-
-def draw_gauge(surface, x, y, width, height, current_value, max_value, color, label):
+    text_surface = text_cache.render(text, size, color)
+    text_rect = align_rect(text_surface.get_rect(), x, y, align)
+    surface.blit(text_surface, text_rect); return text_rect
+
+def draw_gauge(surface, x, y, width, height, current_value, max_value, color, label, label_field=None):
     if current_value < 0: current_value = 0
     fill_pct = current_value / max_value
     fill_width = int(width * fill_pct)
@@ -84,10 +206,114 @@ def draw_gauge(surface, x, y, width, height, current_value, max_value, color, la
     fill_rect = pygame.Rect(x, y, fill_width, height)
     pygame.draw.rect(surface, color, fill_rect)
     pygame.draw.rect(surface, WHITE, outline_rect, 2)
-    draw_text(surface, f"{label}: {current_value:.0f}", height, x + width + 5, y, WHITE, align="topleft")
+    label_text = f"{label}: {current_value:.0f}"
+    if label_field is None: draw_text(surface, label_text, height, x + width + 5, y, WHITE, align="topleft")
+    else: label_field.set(label_text); label_field.draw(surface)
+
+# --- HUD ---
+class Hud:
+    """In-game HUD built from HudText fields; only changed values are re-rendered and reported dirty."""
+    def __init__(self, ship_icon_surf):
+        self.ship_icon_surf = ship_icon_surf
+        self.ship_icon_rect = ship_icon_surf.get_rect(topright=(SCREEN_WIDTH - 35, 70))
+        self.gauge_rect = pygame.Rect(10, 10, 100, 15); self.fuel_value = 0; self.gauge_fill = None
+        self.fuel = HudText(15, 115, 10, align="topleft")
+        self.angle = HudText(18, SCREEN_WIDTH / 2, 10)
+        self.status = HudText(18, SCREEN_WIDTH / 2, 30, RED)
+        self.beacons = HudText(18, SCREEN_WIDTH - 10, 10, align="topright")
+        self.score = HudText(18, SCREEN_WIDTH - 10, 30, align="topright")
+        self.level = HudText(18, SCREEN_WIDTH - 10, 50, align="topright")
+        self.ships = HudText(18, SCREEN_WIDTH - 10, 70, align="topright")
+        self.cache_stats = HudText(14, 10, SCREEN_HEIGHT - 20, GRAY, align="topleft")
+        self.show_cache_stats = False; self.pending_dirty = []
+    def fields(self):
+        fields = (self.fuel, self.angle, self.status, self.beacons, self.score, self.level, self.ships)
+        return fields + (self.cache_stats,) if self.show_cache_stats else fields
+    def toggle_cache_stats(self):
+        self.show_cache_stats = not self.show_cache_stats; self.pending_dirty.append(self.cache_stats.rect); self.cache_stats.text = None
+    def update(self, fuel, angle, landed, num_beacons, score, level, ships):
+        """Set the displayed values; returns the screen rects that change when the HUD is next blitted."""
+        dirty = self.pending_dirty; self.pending_dirty = []
+        self.fuel_value = fuel = max(fuel, 0); gauge_fill = int(self.gauge_rect.width * fuel / MAX_FUEL)
+        if gauge_fill != self.gauge_fill: self.gauge_fill = gauge_fill; dirty.append(self.gauge_rect)
+        self.fuel.set(f"Fuel: {fuel:.0f}")
+        self.angle.set(f"Angle: {angle:.0f}")
+        self.status.set("Landed" if landed else "", YELLOW if landed else RED)
+        self.beacons.set(f"Beacons: {num_beacons}")
+        self.score.set(f"Score: {score}")
+        self.level.set(f"Level: {level}")
+        self.ships.set(f"x {ships}")
+        if self.show_cache_stats: self.cache_stats.set(text_cache.stats_text())
+        dirty.extend(field.dirty_rect() for field in self.fields() if field.changed)
+        return dirty
+    def rects(self):
+        """Screen rects of the gauge, the ship icon and each field."""
+        return [self.gauge_rect, self.ship_icon_rect] + [field.rect for field in self.fields()]
+    def area(self):
+        """Bounding rect of everything the HUD currently draws."""
+        return self.gauge_rect.unionall(self.rects())
+    def blit(self, surface):
+        draw_gauge(surface, self.gauge_rect.x, self.gauge_rect.y, self.gauge_rect.width, self.gauge_rect.height,
+                   self.fuel_value, MAX_FUEL, ORANGE, "Fuel", self.fuel)
+        for field in self.fields(): field.draw(surface)
+        surface.blit(self.ship_icon_surf, self.ship_icon_rect)
+    def draw(self, surface, fuel, angle, landed, num_beacons, score, level, ships):
+        self.update(fuel, angle, landed, num_beacons, score, level, ships); self.blit(surface)
+
+# --- Frame Profiler ---
+class NullProfiler:
+    def begin_frame(self): pass
+    def mark(self, phase): pass
+    def end_frame(self, sprites=0, particles=0): pass
+    def draw_overlay(self, surface): return []
+    def close(self): pass
+
+NULL_PROFILER = NullProfiler()
+
+class FrameProfiler:
+    """Times each phase of a frame into a ring buffer; mark(phase) charges the time since the previous mark to phase."""
+    def __init__(self, phases=PROFILE_PHASES, history=PROFILE_HISTORY, csv_path=None):
+        self.phases = phases; self.phase_index = {phase: i for i, phase in enumerate(phases)}; self.history = history
+        self.samples = np.zeros((history, len(phases) + 1)); self.counts = np.zeros((history, 2), dtype=np.int64)
+        self.current = np.zeros(len(phases)); self.frames = 0; self.frame_start = self.last_mark = time.perf_counter()
+        self.show_overlay = False; self.overlay_lines = []
+        self.csv_file = None; self.csv_writer = None
+        if csv_path:
+            self.csv_file = open(csv_path, 'w', newline=''); self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow(("frame",) + tuple(f"{phase}_ms" for phase in phases) + ("total_ms", "sprites", "particles"))
+    def begin_frame(self):
+        self.current[:] = 0; self.frame_start = self.last_mark = time.perf_counter()
+    def mark(self, phase):
+        now = time.perf_counter(); self.current[self.phase_index[phase]] += now - self.last_mark; self.last_mark = now
+    def end_frame(self, sprites=0, particles=0):
+        row = self.frames % self.history
+        self.samples[row, :-1] = self.current; self.samples[row, -1] = time.perf_counter() - self.frame_start
+        self.counts[row] = (sprites, particles)
+        if self.csv_writer is not None:
+            self.csv_writer.writerow([self.frames] + [f"{value * 1000:.3f}" for value in self.samples[row]] + [sprites, particles])
+        self.frames += 1
+    def recent(self):
+        return self.samples[:min(self.frames, self.history)]
+    def percentiles(self, q=(50, 95, 99)):
+        """Frame time percentiles in ms over the ring buffer."""
+        recent = self.recent()
+        return tuple(np.percentile(recent[:, -1], q) * 1000) if len(recent) else tuple(0.0 for _ in q)
+    def summary_lines(self):
+        p50, p95, p99 = self.percentiles(); recent = self.recent(); means = recent.mean(axis=0) * 1000 if len(recent) else np.zeros(len(self.phases) + 1)
+        sprites, particles = self.counts[(self.frames - 1) % self.history] if self.frames else (0, 0)
+        return [f"frame ms  p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f}",
+                "  ".join(f"{phase} {mean:.2f}" for phase, mean in zip(self.phases, means)),
+                f"sprites {sprites}  particles {particles}  frames {self.frames}"]
+    def draw_overlay(self, surface):
+        """Draw the summary in the bottom-left corner; returns the rects drawn to."""
+        if not self.show_overlay: return []
+        if self.frames % PROFILE_OVERLAY_REFRESH == 0 or not self.overlay_lines: self.overlay_lines = self.summary_lines()
+        y = SCREEN_HEIGHT - 40 - 16 * len(self.overlay_lines)
+        return [draw_text(surface, line, 14, 10, y + i * 16, CYAN, align="topleft") for i, line in enumerate(self.overlay_lines)]
+    def close(self):
+        if self.csv_file is not None: self.csv_file.close(); self.csv_file = None; self.csv_writer = None
 
 # --- High Score Functions ---
-# (High score functions unchanged)
 def load_high_scores():
     scores = []
     if os.path.exists(HIGHSCORE_FILE):
@@ -95,76 +321,280 @@ def load_high_scores():
             with open(HIGHSCORE_FILE, 'r') as f:
                 for line in f:
                     try: scores.append(int(line.strip()))
-                    except ValueError: print(f"Warning: Skipping invalid score line: {line.strip()}")
-        except IOError as e: print(f"Error loading high scores: {e}")
+                    except ValueError: log.warning("Skipping invalid score line: %s", line.strip())
+        except IOError as e: log.error("Error loading high scores: %s", e)
     scores.sort(reverse=True); return scores[:NUM_HIGH_SCORES]
 
-def save_high_scores(scores):
-    scores.sort(reverse=True)
+def write_atomically(path, data, prefix):
+    # Write a temp file next to the target and rename it over, so a crash mid-write never leaves a truncated file.
+    temp_path = None
     try:
-        with open(HIGHSCORE_FILE, 'w') as f:
-            for score in scores[:NUM_HIGH_SCORES]: f.write(f"{score}\n")
-    except IOError as e: print(f"Error saving high scores: {e}")
+        with tempfile.NamedTemporaryFile('wb' if isinstance(data, bytes) else 'w', dir=os.path.dirname(os.path.abspath(path)), prefix=prefix, delete=False) as f:
+            temp_path = f.name; f.write(data); f.flush(); os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except OSError:
+        if temp_path is not None and os.path.exists(temp_path): os.remove(temp_path)
+        raise
+
+def save_high_scores(scores, path=HIGHSCORE_FILE):
+    scores.sort(reverse=True)
+    try: write_atomically(path, "".join(f"{score}\n" for score in scores[:NUM_HIGH_SCORES]), ".highscores-")
+    except OSError as e: log.error("Error saving high scores: %s", e)
 
-def add_high_score(new_score, scores):
+class BackgroundWriter:
+    """Saves with write(data, path) on a background thread so disk I/O never stalls a frame."""
+    def __init__(self, path, write, name="writer"):
+        self.path = path; self.write = write; self.pending = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True); self.thread.start()
+    def save(self, data): self.pending.put(data)
+    def _run(self):
+        stopping = False
+        while not stopping:
+            latest = self.pending.get()
+            # Only the newest data matters; skip anything superseded while the disk was busy.
+            while not self.pending.empty():
+                newer = self.pending.get()
+                if newer is None: stopping = True
+                else: latest = newer
+            if latest is None: return
+            self.write(latest, self.path)
+    def close(self, timeout=5.0):
+        """Flush pending writes and stop the thread."""
+        self.pending.put(None); self.thread.join(timeout)
+
+class HighScoreWriter(BackgroundWriter):
+    def __init__(self, path=HIGHSCORE_FILE): super().__init__(path, save_high_scores, "highscore-writer")
+    def save(self, scores): super().save(list(scores))
+
+def add_high_score(new_score, scores, writer=None):
     if new_score <= 0: return scores
     scores.append(new_score); scores.sort(reverse=True)
-    updated_scores = scores[:NUM_HIGH_SCORES]; save_high_scores(updated_scores)
+    updated_scores = scores[:NUM_HIGH_SCORES]
+    if writer is not None: writer.save(updated_scores)
+    else: save_high_scores(list(updated_scores))
     return updated_scores
 
-# --- Particle Class ---
-# (Particle class unchanged)
-class Particle(pygame.sprite.Sprite):
-    def __init__(self, pos, vel, size, color, lifespan):
-        super().__init__(); self.pos = pygame.Vector2(pos); self.vel = pygame.Vector2(vel)
-        self.size = int(size); self.color = color; self.lifespan = lifespan
-        self.spawn_time = pygame.time.get_ticks()
-        self.image = pygame.Surface([max(1, self.size), max(1, self.size)], pygame.SRCALPHA)
-        pygame.draw.circle(self.image, self.color, (self.size // 2, self.size // 2), self.size // 2)
-        self.rect = self.image.get_rect(center=self.pos)
+# --- Particle System ---
+# All particles live in flat NumPy arrays: one vectorized update per frame, expired
+# particles are compacted out in bulk, and drawing blits shared pre-rendered stamps.
+PARTICLE_COLORS = SMOKE_COLORS + EXPLOSION_COLORS
+_particle_stamps = {}
+
+def particle_alpha(alpha_level): return int(255 * (alpha_level + 1) / PARTICLE_ALPHA_LEVELS)
+
+def get_particle_base(size, color_index):
+    key = (size, color_index, None); base = _particle_stamps.get(key)
+    if base is None:
+        base = _particle_stamps[key] = pygame.Surface([max(1, size), max(1, size)], pygame.SRCALPHA)
+        pygame.draw.circle(base, PARTICLE_COLORS[color_index], (size // 2, size // 2), size // 2)
+    return base
+
+def get_particle_stamp(size, color_index, alpha_level):
+    key = (size, color_index, alpha_level); stamp = _particle_stamps.get(key)
+    if stamp is None:
+        stamp = _particle_stamps[key] = get_particle_base(size, color_index).copy(); stamp.set_alpha(particle_alpha(alpha_level))
+    return stamp
+
+class ParticleSystem:
+    """Structure-of-arrays particle store with a hard cap of `capacity` live particles."""
+    def __init__(self, capacity=MAX_PARTICLES):
+        self.capacity = capacity; self.count = 0; self.time = 0.0; self.dropped = 0
+        self.pos = np.zeros((capacity, 2)); self.vel = np.zeros((capacity, 2))
+        self.size = np.zeros(capacity, dtype=np.int32); self.color = np.zeros(capacity, dtype=np.int32)
+        self.spawn_time = np.zeros(capacity); self.lifespan = np.ones(capacity)
+    def __len__(self): return self.count
+    def clear(self): self.count = 0
+    def emit(self, pos, vel, size, color, lifespan):
+        """Append a batch of particles; anything past the cap is dropped."""
+        n = min(len(size), self.capacity - self.count)
+        if n < len(size): self.dropped += len(size) - n
+        if n <= 0: return 0
+        batch = slice(self.count, self.count + n)
+        self.pos[batch] = pos[:n]; self.vel[batch] = vel[:n]; self.size[batch] = size[:n]
+        self.color[batch] = color[:n]; self.lifespan[batch] = lifespan[:n]; self.spawn_time[batch] = self.time
+        self.count += n; return n
     def update(self, dt):
-        self.pos += self.vel; self.rect.center = self.pos
-        elapsed_time = (pygame.time.get_ticks() - self.spawn_time) / 1000.0
-        if elapsed_time >= self.lifespan: self.kill()
-        else: self.image.set_alpha(int(max(0, 255 * (1 - (elapsed_time / self.lifespan)))))
+        self.time += dt; n = self.count
+        if not n: return
+        self.pos[:n] += self.vel[:n]
+        alive = (self.time - self.spawn_time[:n]) < self.lifespan[:n]
+        if not alive.all():
+            keep = np.flatnonzero(alive); k = len(keep)
+            for arr in (self.pos, self.vel, self.size, self.color, self.spawn_time, self.lifespan): arr[:k] = arr[keep]
+            self.count = k
+    def stamps(self, interpolation=1.0, camera_x=0):
+        """Per live particle: size, color index, alpha level and top-left screen position, as arrays.
+        interpolation in [0, 1] places particles between the previous and current tick."""
+        n = self.count
+        fade = 1 - (self.time - self.spawn_time[:n]) / self.lifespan[:n]
+        alpha_levels = np.clip(np.ceil(fade * PARTICLE_ALPHA_LEVELS) - 1, 0, PARTICLE_ALPHA_LEVELS - 1).astype(np.int32)
+        sizes = self.size[:n]; half = sizes // 2
+        pos = self.pos[:n] if interpolation >= 1 else self.pos[:n] - self.vel[:n] * (1 - interpolation)
+        return sizes, self.color[:n], alpha_levels, pos[:, 0].astype(np.int32) - half - camera_x, pos[:, 1].astype(np.int32) - half
+    def draw(self, surface, interpolation=1.0, camera_x=0):
+        """Blit all live particles; returns their bounding rect (None if there are none)."""
+        if not self.count: return None
+        sizes, colors, alpha_levels, xs, ys = self.stamps(interpolation, camera_x)
+        surface.blits([(get_particle_stamp(size, color, level), (x, y)) for size, color, level, x, y in
+                       zip(sizes.tolist(), colors.tolist(), alpha_levels.tolist(), xs.tolist(), ys.tolist())], doreturn=False)
+        left = int(xs.min()); top = int(ys.min())
+        return pygame.Rect(left, top, int((xs + sizes).max()) - left + 1, int((ys + sizes).max()) - top + 1).clip(surface.get_rect())
 
 # --- Smoke/Explosion Generation Functions ---
-# (create_smoke, create_explosion unchanged)
-def create_smoke(pos, num_particles, all_sprites_group):
-    for _ in range(num_particles):
-        angle = random.uniform(0, math.pi * 2); speed = random.uniform(SMOKE_SPEED_MIN, SMOKE_SPEED_MAX)
-        p_vel = pygame.Vector2(math.cos(angle), math.sin(angle)) * speed
-        p_vel.y += random.uniform(-0.5, -1.5); p_size = random.randint(2, 6)
-        p_color = random.choice([SMOKE_COLOR_1, SMOKE_COLOR_2, SMOKE_COLOR_3])
-        p_lifespan = random.uniform(SMOKE_LIFESPAN_MIN, SMOKE_LIFESPAN_MAX)
-        p_pos = pos + pygame.Vector2(random.randint(-5, 5), random.randint(-5, 5))
-        particle = Particle(p_pos, p_vel, p_size, p_color, p_lifespan); all_sprites_group.add(particle)
-
-def create_explosion(pos, num_particles, all_sprites_group):
-    for _ in range(num_particles):
-        angle = random.uniform(0, math.pi * 2); speed = random.uniform(EXPLOSION_SPEED_MIN, EXPLOSION_SPEED_MAX)
-        p_vel = pygame.Vector2(math.cos(angle), math.sin(angle)) * speed
-        p_size = random.randint(3, 7)
-        p_color = random.choice([EXPLOSION_COLOR_1, EXPLOSION_COLOR_2, EXPLOSION_COLOR_3, EXPLOSION_COLOR_4])
-        p_lifespan = random.uniform(EXPLOSION_LIFESPAN_MIN, EXPLOSION_LIFESPAN_MAX)
-        p_pos = pos + pygame.Vector2(random.randint(-8, 8), random.randint(-8, 8))
-        particle = Particle(p_pos, p_vel, p_size, p_color, p_lifespan); all_sprites_group.add(particle)
+# Particles are cosmetic and never feed back into the simulation, so they draw from their own
+# generator and recordings replay identically whatever it produces.
+particle_rng = np.random.default_rng()
+
+def _random_burst(pos, num_particles, speed_min, speed_max, size_min, size_max, colors, lifespan_min, lifespan_max, spread):
+    angle = particle_rng.uniform(0, math.pi * 2, num_particles); speed = particle_rng.uniform(speed_min, speed_max, num_particles)
+    vel = np.column_stack((np.cos(angle), np.sin(angle))) * speed[:, None]
+    size = particle_rng.integers(size_min, size_max + 1, num_particles)
+    color = PARTICLE_COLORS.index(colors[0]) + particle_rng.integers(0, len(colors), num_particles)
+    lifespan = particle_rng.uniform(lifespan_min, lifespan_max, num_particles)
+    p_pos = np.asarray(pos, dtype=float) + particle_rng.integers(-spread, spread + 1, (num_particles, 2))
+    return p_pos, vel, size, color, lifespan
+
+def create_smoke(pos, num_particles, particles):
+    p_pos, vel, size, color, lifespan = _random_burst(pos, num_particles, SMOKE_SPEED_MIN, SMOKE_SPEED_MAX, 2, 6,
+                                                      SMOKE_COLORS, SMOKE_LIFESPAN_MIN, SMOKE_LIFESPAN_MAX, 5)
+    vel[:, 1] += particle_rng.uniform(-1.5, -0.5, num_particles)
+    particles.emit(p_pos, vel, size, color, lifespan)
 
+def create_explosion(pos, num_particles, particles):
+    p_pos, vel, size, color, lifespan = _random_burst(pos, num_particles, EXPLOSION_SPEED_MIN, EXPLOSION_SPEED_MAX, 3, 7,
+                                                      EXPLOSION_COLORS, EXPLOSION_LIFESPAN_MIN, EXPLOSION_LIFESPAN_MAX, 8)
+    particles.emit(p_pos, vel, size, color, lifespan)
+
+
+# --- Rotation Atlas ---
+# Rotated images are looked up per integer angle instead of rotating and re-masking
+# on every turn. Atlases are shared between sprites and filled lazily (or warmed up front).
+class RotationAtlas:
+    """Rotated images, rects and collision masks of one base surface, cached per integer angle."""
+    def __init__(self, base_image):
+        self.base_image = base_image; self.frames = {}
+    def get(self, angle):
+        key = int(round(angle)) % 360; frame = self.frames.get(key)
+        if frame is None:
+            image = pygame.transform.rotate(self.base_image, -key)
+            frame = self.frames[key] = (image, image.get_rect(), pygame.mask.from_surface(image))
+        return frame
+    def build(self, angles):
+        for angle in angles: self.get(angle)
+        return self
+
+_atlases = {}
+
+def get_atlas(name, make_base_image):
+    atlas = _atlases.get(name)
+    if atlas is None: atlas = _atlases[name] = RotationAtlas(make_base_image())
+    return atlas
+
+def make_ship_image(with_gear):
+    image = pygame.Surface([20, 15], pygame.SRCALPHA); image.fill((0,0,0,0))
+    pygame.draw.polygon(image, PLAYER_COLOR, [(20, 7), (0, 0), (0, 14)])
+    if with_gear:
+        gear_color = PLAYER_COLOR
+        pygame.draw.line(image, gear_color, (2, 14), (2, 19), GEAR_LINE_THICKNESS)
+        pygame.draw.line(image, gear_color, (17, 14), (17, 19), GEAR_LINE_THICKNESS)
+        pygame.draw.line(image, gear_color, (0, 19), (4, 19), GEAR_LINE_THICKNESS)
+        pygame.draw.line(image, gear_color, (15, 19), (19, 19), GEAR_LINE_THICKNESS)
+    return image
+
+def make_laser_image():
+    image = pygame.Surface([6, 2], pygame.SRCALPHA); image.fill(CYAN); return image
+
+def ship_atlas(with_gear):
+    return get_atlas("ship_gear" if with_gear else "ship", lambda: make_ship_image(with_gear))
+
+def laser_atlas(): return get_atlas("laser", make_laser_image)
+
+def warm_rotation_atlases():
+    # The ship starts at 270 and turns in ROTATION_SPEED steps, so only these angles are reachable.
+    reachable = range(270 % ROTATION_SPEED, 360, ROTATION_SPEED)
+    ship_atlas(False).build(reachable); ship_atlas(True).build(reachable); laser_atlas().build(reachable)
+
+# --- Collision ---
+# A uniform-grid spatial hash is the broad phase for every collision query; the narrow
+# phase is analytic for circles and the ship hull, with masks only as a fallback.
+class SpatialHash:
+    """Uniform grid bucketing items by every cell their bounding rect touches. Query results must not be modified."""
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        self.cell_size = cell_size; self.cells = defaultdict(list); self.item_cells = {}
+    def __len__(self): return len(self.item_cells)
+    def _cell_keys(self, rect):
+        cs = self.cell_size
+        return [(cx, cy) for cx in range(rect.left // cs, (rect.right - 1) // cs + 1)
+                         for cy in range(rect.top // cs, (rect.bottom - 1) // cs + 1)]
+    def insert(self, item, rect):
+        keys = self._cell_keys(rect); self.item_cells[id(item)] = keys
+        for key in keys: self.cells[key].append(item)
+    def remove(self, item):
+        for key in self.item_cells.pop(id(item), ()):
+            bucket = self.cells[key]; bucket.remove(item)
+            if not bucket: del self.cells[key]
+    def clear(self): self.cells.clear(); self.item_cells.clear()
+    def query(self, rect):
+        cells = self.cells
+        if not cells: return []
+        cs = self.cell_size; x0 = rect.left // cs; x1 = (rect.right - 1) // cs; y0 = rect.top // cs; y1 = (rect.bottom - 1) // cs
+        if x0 == x1 and y0 == y1: return cells.get((x0, y0), [])
+        found = []
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                for item in cells.get((cx, cy), ()):
+                    if item not in found: found.append(item)
+        return found
+
+def circle_rect(x, y, radius): return pygame.Rect(int(x - radius), int(y - radius), int(radius * 2) + 1, int(radius * 2) + 1)
+
+def circles_overlap(ax, ay, a_radius, bx, by, b_radius):
+    dx = ax - bx; dy = ay - by; reach = a_radius + b_radius
+    return dx * dx + dy * dy <= reach * reach
+
+def circle_triangle_overlap(cx, cy, radius, triangle):
+    (ax, ay), (bx, by), (px, py) = triangle
+    # Centre inside the triangle (same sign against all three edges)?
+    d1 = (cx - bx) * (ay - by) - (ax - bx) * (cy - by)
+    d2 = (cx - px) * (by - py) - (bx - px) * (cy - py)
+    d3 = (cx - ax) * (py - ay) - (px - ax) * (cy - ay)
+    if not ((d1 < 0 or d2 < 0 or d3 < 0) and (d1 > 0 or d2 > 0 or d3 > 0)): return True
+    r2 = radius * radius
+    for (x1, y1), (x2, y2) in (((ax, ay), (bx, by)), ((bx, by), (px, py)), ((px, py), (ax, ay))):
+        ex = x2 - x1; ey = y2 - y1; length2 = ex * ex + ey * ey
+        t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((cx - x1) * ex + (cy - y1) * ey) / length2))
+        dx = x1 + ex * t - cx; dy = y1 + ey * t - cy
+        if dx * dx + dy * dy <= r2: return True
+    return False
+
+SHIP_HULL = ((20, 7), (0, 0), (0, 14)); SHIP_HULL_CENTER = (10, 7.5)
+
+def ship_hull(player):
+    """The ship triangle in screen space, matching the rotated sprite image."""
+    cx, cy = player.rect.center; rad_angle = math.radians(player.angle); cos_a = math.cos(rad_angle); sin_a = math.sin(rad_angle)
+    return tuple((cx + (x - SHIP_HULL_CENTER[0]) * cos_a - (y - SHIP_HULL_CENTER[1]) * sin_a,
+                  cy + (x - SHIP_HULL_CENTER[0]) * sin_a + (y - SHIP_HULL_CENTER[1]) * cos_a) for x, y in SHIP_HULL)
+
+def player_hits_obstacle(player, obstacle):
+    if not player.rect.colliderect(obstacle.rect): return False
+    # The gear legs aren't part of the hull triangle, so fall back to a pixel test with the gear out.
+    if player.landing_gear_deployed: return pygame.sprite.collide_mask(player, obstacle) is not None
+    return circle_triangle_overlap(obstacle.pos.x, obstacle.pos.y, obstacle.radius, ship_hull(player))
+
+def laser_hits_beacon(laser, beacon):
+    return circles_overlap(laser.pos.x, laser.pos.y, LASER_HIT_RADIUS, beacon.pos.x, beacon.pos.y, beacon.radius)
 
 # --- Laser Class ---
-# (Laser class unchanged)
 class Laser(pygame.sprite.Sprite):
-    def __init__(self, pos, angle):
-        super().__init__(); self.image = pygame.Surface([6, 2], pygame.SRCALPHA); self.image.fill(CYAN)
-        self.image = pygame.transform.rotate(self.image, -angle); self.rect = self.image.get_rect(center=pos)
+    def __init__(self, pos, angle, bounds=SCREEN_RECT):
+        super().__init__(); self.image, rect, _ = laser_atlas().get(angle); self.rect = rect.copy(); self.rect.center = pos; self.angle = angle
         rad_angle = math.radians(angle); self.vel = pygame.Vector2(math.cos(rad_angle), math.sin(rad_angle)) * LASER_SPEED
-        self.pos = pygame.Vector2(pos)
+        self.pos = pygame.Vector2(pos); self.prev_center = self.rect.center; self.bounds = bounds  # the camera in scrolling worlds
     def update(self, dt):
-        self.pos += self.vel; self.rect.center = self.pos
-        if not pygame.display.get_surface().get_rect().colliderect(self.rect): self.kill()
+        self.prev_center = self.rect.center; self.pos += self.vel; self.rect.center = self.pos
+        if not self.bounds.colliderect(self.rect): self.kill()
 
 # --- Beacon Class ---
-# (Beacon class unchanged)
 class Beacon(pygame.sprite.Sprite):
     def __init__(self, center_pos):
         super().__init__(); self.image = pygame.Surface([BEACON_RADIUS * 2, BEACON_RADIUS * 2], pygame.SRCALPHA)
@@ -173,7 +603,6 @@ class Beacon(pygame.sprite.Sprite):
     def update(self, dt): pass
 
 # --- Obstacle Class ---
-# (Obstacle class unchanged)
 class Obstacle(pygame.sprite.Sprite):
     def __init__(self, center_pos, radius):
         super().__init__(); self.radius = radius
@@ -184,59 +613,53 @@ class Obstacle(pygame.sprite.Sprite):
 
 
 # --- Player Ship Class ---
-# (Player class uses new constants but logic is unchanged)
 class Player(pygame.sprite.Sprite):
     def __init__(self):
         super().__init__()
-        raw_base_image = pygame.Surface([20, 15], pygame.SRCALPHA); raw_base_image.fill((0,0,0,0))
-        pygame.draw.polygon(raw_base_image, PLAYER_COLOR, [(20, 7), (0, 0), (0, 14)])
-        self.base_image_no_gear = raw_base_image
-        self.base_image_with_gear = self.base_image_no_gear.copy()
-        gear_color = PLAYER_COLOR
-        pygame.draw.line(self.base_image_with_gear, gear_color, (2, 14), (2, 19), GEAR_LINE_THICKNESS)
-        pygame.draw.line(self.base_image_with_gear, gear_color, (17, 14), (17, 19), GEAR_LINE_THICKNESS)
-        pygame.draw.line(self.base_image_with_gear, gear_color, (0, 19), (4, 19), GEAR_LINE_THICKNESS)
-        pygame.draw.line(self.base_image_with_gear, gear_color, (15, 19), (19, 19), GEAR_LINE_THICKNESS)
-        self.image = self.base_image_no_gear
-        self.rect = self.image.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4))
-        self.mask = pygame.mask.from_surface(self.image)
+        self.atlas_no_gear = ship_atlas(False); self.atlas_with_gear = ship_atlas(True)
+        self.base_image_no_gear = self.atlas_no_gear.base_image; self.base_image_with_gear = self.atlas_with_gear.base_image
+        self.image, rect, self.mask = self.atlas_no_gear.get(0)
+        self.rect = rect.copy(); self.rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4)
         self.pos = pygame.Vector2(self.rect.center); self.vel = pygame.Vector2(0, 0)
         self.angle = 270; self.thrusting = False; self.boosting = False
         self.landed = False; self.crashed = False; self.fuel = MAX_FUEL
         self.last_shot_time = 0; self.landing_gear_deployed = False
-        self.just_landed = False; self.just_took_off = False
-        self._update_rotation_visuals()
+        self.just_landed = False; self.just_took_off = False; self.inputs = 0
+        self.terrain = None  # None: the classic flat ground and wrapping screen edges
+        self._update_rotation_visuals(); self.prev_center = self.rect.center
     def reset(self):
-        print("Player Resetting..."); self.pos = pygame.Vector2(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4)
+        log.debug("Player resetting"); self.pos = pygame.Vector2(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4)
         self.vel = pygame.Vector2(0, 0); self.angle = 270; self.fuel = MAX_FUEL
         self.crashed = False; self.landed = False; self.thrusting = False; self.boosting = False
-        self.landing_gear_deployed = False; self._update_rotation_visuals()
+        self.landing_gear_deployed = False; self.just_landed = False; self.just_took_off = False; self.inputs = 0
+        self._update_rotation_visuals(); self.rect.center = self.pos; self.prev_center = self.rect.center
     def rotate(self, direction):
         if self.landed: return
         self.angle = (self.angle + direction * ROTATION_SPEED) % 360; self._update_rotation_visuals()
     def _update_rotation_visuals(self):
         center = self.rect.center
-        current_base = self.base_image_with_gear if self.landing_gear_deployed else self.base_image_no_gear
-        self.image = pygame.transform.rotate(current_base, -self.angle)
-        self.rect = self.image.get_rect(center=center); self.mask = pygame.mask.from_surface(self.image)
-    def shoot(self, all_sprites, lasers_group):
-        now = pygame.time.get_ticks()
+        current_atlas = self.atlas_with_gear if self.landing_gear_deployed else self.atlas_no_gear
+        self.image, rect, self.mask = current_atlas.get(self.angle)
+        self.rect = rect.copy(); self.rect.center = center
+    def ground_level(self):
+        return SCREEN_HEIGHT - GROUND_HEIGHT if self.terrain is None else self.terrain.ground_under(self.pos.x, self.rect.width)
+    def shoot(self, now, all_sprites, lasers_group, bounds=SCREEN_RECT):
         if now - self.last_shot_time > LASER_COOLDOWN:
             self.last_shot_time = now; rad_angle = math.radians(self.angle)
             base_nose_offset = pygame.Vector2(self.base_image_no_gear.get_width() / 2 + 5, 0)
             rotated_offset = base_nose_offset.rotate(self.angle); laser_pos = self.pos + rotated_offset
-            new_laser = Laser(laser_pos, self.angle); all_sprites.add(new_laser); lasers_group.add(new_laser)
+            new_laser = Laser(laser_pos, self.angle, bounds); all_sprites.add(new_laser); lasers_group.add(new_laser)
     def update(self, dt):
-        self.just_landed = False; self.just_took_off = False
-        ground_level = SCREEN_HEIGHT - GROUND_HEIGHT
+        # One fixed SIM_DT tick; self.inputs holds this tick's INPUT_* bits.
+        self.prev_center = self.rect.center; self.just_landed = False; self.just_took_off = False
+        ground_level = self.ground_level()
         altitude_above_ground = ground_level - (self.pos.y + self.rect.height / 2)
         gear_angle_diff = abs(((self.angle - 270 + 180) % 360) - 180)
         should_deploy_gear = (altitude_above_ground <= GEAR_DEPLOY_ALTITUDE and
                               gear_angle_diff <= GEAR_DEPLOY_ANGLE_TOLERANCE and not self.landed)
         if should_deploy_gear != self.landing_gear_deployed:
             self.landing_gear_deployed = should_deploy_gear; self._update_rotation_visuals()
-        keys = pygame.key.get_pressed(); thrust_input = keys[pygame.K_UP] or keys[pygame.K_w]
-        boost_input = keys[pygame.K_LSHIFT] or keys[pygame.K_RSHIFT]
+        thrust_input = self.inputs & INPUT_THRUST; boost_input = self.inputs & INPUT_BOOST
         self.thrusting = False; self.boosting = False; apply_thrust_acc = pygame.Vector2(0, 0)
         if thrust_input and self.fuel > 0:
             if boost_input and self.fuel >= BOOST_FUEL_CONSUMPTION:
@@ -257,8 +680,12 @@ class Player(pygame.sprite.Sprite):
         speed = self.vel.length();
         if speed > MAX_SPEED: self.vel.scale_to_length(MAX_SPEED) # Uses new constant
         if not self.landed: self.pos += self.vel
-        on_ground = self.pos.y + self.rect.height / 2 >= ground_level
-        if self.pos.x > SCREEN_WIDTH + self.rect.width / 2: self.pos.x = -self.rect.width / 2
+        ground_level = self.ground_level(); on_ground = self.pos.y + self.rect.height / 2 >= ground_level
+        if self.terrain is not None:
+            # Scrolling worlds end in walls instead of wrapping.
+            half_width = self.rect.width / 2; x = min(max(self.pos.x, half_width), self.terrain.width - half_width)
+            if x != self.pos.x: self.pos.x = x; self.vel.x = 0
+        elif self.pos.x > SCREEN_WIDTH + self.rect.width / 2: self.pos.x = -self.rect.width / 2
         elif self.pos.x < -self.rect.width / 2: self.pos.x = SCREEN_WIDTH + self.rect.width / 2
         if self.pos.y < self.rect.height / 2: self.pos.y = self.rect.height / 2;
         if self.vel.y < 0: self.vel.y = 0
@@ -277,11 +704,791 @@ class Player(pygame.sprite.Sprite):
             if self.fuel > MAX_FUEL: self.fuel = MAX_FUEL
         if not self.landed and not self.crashed: self.rect.center = self.pos
 
+# --- Terrain ---
+# Scrolling worlds replace the flat ground with a per-column heightmap. The heightmap is the
+# collision shape (landing, crashing and lasers all test against it directly); the chunk
+# surfaces are only for drawing, built on first sight and kept in a small LRU.
+class Terrain:
+    """Ground for a world `width` pixels wide; heights[x] is the y of the ground's top edge in column x."""
+    def __init__(self, width, seed):
+        rng = random.Random(seed); ground = SCREEN_HEIGHT - GROUND_HEIGHT; self.width = width
+        knots = np.array([rng.uniform(ground - TERRAIN_RELIEF, ground) for _ in range(width // TERRAIN_FEATURE + 2)])
+        t = np.arange(width) / TERRAIN_FEATURE; knot = t.astype(np.int64); t = (1 - np.cos((t - knot) * math.pi)) / 2
+        heights = knots[knot] * (1 - t) + knots[knot + 1] * t
+        # Flat pads to land on: one under the spawn point, then every TERRAIN_PAD_SPACING.
+        for center in [SCREEN_WIDTH // 2] + list(range(TERRAIN_PAD_SPACING + SCREEN_WIDTH // 2, width - TERRAIN_PAD_WIDTH, TERRAIN_PAD_SPACING)):
+            pad = slice(max(0, center - TERRAIN_PAD_WIDTH // 2), center + TERRAIN_PAD_WIDTH // 2); heights[pad] = heights[pad].max()
+        self.heights = heights.astype(np.int32); self.chunks = OrderedDict()
+    def ground_under(self, x, width):
+        """Highest ground (smallest y) under a span `width` wide centred on x."""
+        left = min(max(int(x - width / 2), 0), self.width - 1); right = min(max(int(x + width / 2), left), self.width - 1)
+        return int(self.heights[left:right + 1].min())
+    def solid_at(self, x, y): return 0 <= x < self.width and y >= self.heights[int(x)]
+    def chunk(self, index):
+        surface = self.chunks.get(index)
+        if surface is not None: self.chunks.move_to_end(index); return surface
+        left = index * TERRAIN_CHUNK_WIDTH; heights = self.heights[left:left + TERRAIN_CHUNK_WIDTH + 1].tolist()
+        surface = pygame.Surface((TERRAIN_CHUNK_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        pygame.draw.polygon(surface, GREEN, [(0, SCREEN_HEIGHT)] + list(enumerate(heights)) + [(len(heights) - 1, SCREEN_HEIGHT)])
+        self.chunks[index] = surface
+        if len(self.chunks) > TERRAIN_CHUNK_CACHE: self.chunks.popitem(last=False)
+        return surface
+    def draw(self, surface, camera_x):
+        """Blit the chunks overlapping the view that starts at camera_x."""
+        first = camera_x // TERRAIN_CHUNK_WIDTH; last = min((camera_x + SCREEN_WIDTH - 1) // TERRAIN_CHUNK_WIDTH, (self.width - 1) // TERRAIN_CHUNK_WIDTH)
+        surface.blits([(self.chunk(i), (i * TERRAIN_CHUNK_WIDTH - camera_x, 0)) for i in range(first, last + 1)], doreturn=False)
+
+# --- Level Generation ---
+# Layouts are plain data built from a seed with jittered-grid sampling: every item gets
+# its own grid cell, so nothing can overlap. Cells never shrink below a beacon's width;
+# once the grid is full (from about level 330) later levels stop adding obstacles, then beacons.
+# beacons: (x, y); obstacles: (x, y, radius); terrain: a Terrain for scrolling worlds, else None
+LevelLayout = namedtuple("LevelLayout", "level seed beacons obstacles terrain", defaults=(None,))
+
+def level_counts(level):
+    num_obstacles = (level - 1) * NUM_OBSTACLES_PER_LEVEL if level >= 2 else 0
+    return NUM_BEACONS_BASE + level - 1, num_obstacles
+
+def level_seed(session_seed, level): return (session_seed * 1000003 + level) & 0xFFFFFFFF
+
+def generate_level_layout(level, seed):
+    rng = random.Random(seed); num_beacons, num_obstacles = level_counts(level); total = num_beacons + num_obstacles
+    width, height = SCREEN_WIDTH, LEVEL_AREA_HEIGHT
+    # Leave spare cells so the layout doesn't look like a grid, unless that would squeeze obstacles below their minimum size.
+    min_cell = OBSTACLE_RADIUS_MIN * 2 + 2 if num_obstacles else BEACON_RADIUS * 2 + 2
+    target_cells = max(total, min(total * LEVEL_GRID_SLACK, (width * height) // (min_cell * min_cell)))
+    smallest_cell = BEACON_RADIUS * 2; cell = max(math.sqrt(width * height / max(target_cells, 1)), smallest_cell)
+    spawn_area = circle_rect(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 4, PLAYER_SPAWN_CLEARANCE)
+    while True:
+        cols = max(1, int(width // cell)); rows = max(1, int(height // cell))
+        cell_w = width / cols; cell_h = height / rows
+        free_cells = [(c * cell_w, r * cell_h) for r in range(rows) for c in range(cols)
+                      if not (c * cell_w < spawn_area.right and spawn_area.left < (c + 1) * cell_w and r * cell_h < spawn_area.bottom and spawn_area.top < (r + 1) * cell_h)]
+        if len(free_cells) >= total or cell <= smallest_cell: break
+        cell = max(cell * 0.95, smallest_cell)
+    if len(free_cells) < total:
+        num_beacons = min(num_beacons, len(free_cells)); num_obstacles = len(free_cells) - num_beacons; total = len(free_cells)
+    rng.shuffle(free_cells)
+    def jitter(x0, y0, radius):
+        x_room = max(0.0, cell_w - 2 * radius); y_room = max(0.0, cell_h - 2 * radius)
+        return int(x0 + min(radius, cell_w / 2) + rng.uniform(0, x_room)), int(y0 + min(radius, cell_h / 2) + rng.uniform(0, y_room))
+    beacons = tuple(jitter(x0, y0, BEACON_RADIUS) for x0, y0 in free_cells[:num_beacons])
+    max_radius = max(1, int(min(cell_w, cell_h) // 2) - 1); obstacles = []
+    for x0, y0 in free_cells[num_beacons:total]:
+        radius = min(rng.randint(OBSTACLE_RADIUS_MIN, OBSTACLE_RADIUS_MAX), max_radius)
+        obstacles.append(jitter(x0, y0, radius) + (radius,))
+    return LevelLayout(level, seed, beacons, tuple(obstacles))
+
+def generate_world_layout(level, seed, screens):
+    """A scrolling level `screens` screens wide: terrain plus one screen's worth of items per screen."""
+    terrain = Terrain(screens * SCREEN_WIDTH, seed); beacons = []; obstacles = []
+    def above_ground(x, y, radius): return y + radius + TERRAIN_CLEARANCE < terrain.ground_under(x, radius * 2)
+    for screen in range(screens):
+        part = generate_level_layout(level, (seed + screen * 7919) & 0xFFFFFFFF); dx = screen * SCREEN_WIDTH
+        beacons += [(x + dx, y) for x, y in part.beacons if above_ground(x + dx, y, BEACON_RADIUS)]
+        obstacles += [(x + dx, y, radius) for x, y, radius in part.obstacles if above_ground(x + dx, y, radius)]
+    return LevelLayout(level, seed, tuple(beacons), tuple(obstacles), terrain)
+
+def generate_layout(level, seed, world_screens=None):
+    return generate_world_layout(level, seed, world_screens) if world_screens else generate_level_layout(level, seed)
+
+class LevelCache:
+    """Generates the next few level layouts of a session ahead of time on a worker thread."""
+    def __init__(self, session_seed, ahead=LEVEL_CACHE_AHEAD, world_screens=None):
+        self.session_seed = session_seed; self.ahead = ahead; self.world_screens = world_screens; self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="levelgen")
+    def prefetch(self, level):
+        for upcoming in range(level, level + self.ahead + 1):
+            if upcoming not in self.pending:
+                self.pending[upcoming] = self.executor.submit(generate_layout, upcoming, level_seed(self.session_seed, upcoming), self.world_screens)
+    def get(self, level):
+        self.prefetch(level); layout = self.pending.pop(level).result()
+        for stale in [cached for cached in self.pending if cached < level]: self.pending.pop(stale).cancel()
+        self.prefetch(level + 1); return layout
+    def close(self): self.executor.shutdown(wait=False, cancel_futures=True); self.pending.clear()
+
+# --- Simulation Core ---
+# Game rules for one level, stepped on a fixed SIM_DT tick from INPUT_* bits. Nothing
+# here touches the display, so it runs headless and faster than real time.
+def read_input_bits(keys):
+    bits = 0
+    if keys[pygame.K_UP] or keys[pygame.K_w]: bits |= INPUT_THRUST
+    if keys[pygame.K_LSHIFT] or keys[pygame.K_RSHIFT]: bits |= INPUT_BOOST
+    if keys[pygame.K_LEFT] or keys[pygame.K_a]: bits |= INPUT_LEFT
+    if keys[pygame.K_RIGHT] or keys[pygame.K_d]: bits |= INPUT_RIGHT
+    return bits
+
+class Simulation:
+    """A play session: level progression, score and lives. The player carries over between levels; each level gets new sprite groups."""
+    def __init__(self, level=1, score=0, ships=INITIAL_SHIPS, effects=True, seed=None, level_cache=None, profiler=None, world_screens=None):
+        self.level = level; self.score = score; self.ships = ships
+        self.level_cache = level_cache; self.profiler = profiler or NULL_PROFILER
+        self.world_screens = level_cache.world_screens if level_cache else world_screens
+        self.terrain = None; self.world_width = SCREEN_WIDTH
+        # What's in view; lasers die when they leave it. Always SCREEN_RECT's area on classic levels.
+        self.camera = pygame.Rect(SCREEN_RECT)
+        self.seed = seed if seed is not None else (level_cache.session_seed if level_cache else random.getrandbits(32))
+        self.extra_life_threshold = (score // EXTRA_LIFE_SCORE + 1) * EXTRA_LIFE_SCORE
+        self.tick = 0; self.state = PLAYING; self.death_anim_start_time = 0
+        self.static_version = 0  # bumped whenever beacons or obstacles change, for cached background layers
+        self.player = Player(); self.all_sprites = pygame.sprite.Group(self.player); self.lasers = pygame.sprite.Group()
+        self.beacons = pygame.sprite.Group(); self.obstacles = pygame.sprite.Group()
+        self.beacon_hash = SpatialHash(); self.obstacle_hash = SpatialHash()
+        self.particles = ParticleSystem() if effects else None
+        warm_rotation_atlases(); self.start_level(level)
+    @property
+    def time_ms(self): return self.tick * 1000 // SIM_HZ
+    def player_alive(self): return bool(self.player.groups())
+    def start_level(self, level):
+        self.clear_level(); self.level = level; self.state = PLAYING; self.spawn_level()
+    def clear_level(self):
+        """Drop everything belonging to the current level, keeping the session."""
+        for sprite in self.all_sprites.sprites(): sprite.kill()
+        # New groups rather than emptied ones: a group never gives back the room its busiest level needed.
+        self.all_sprites = pygame.sprite.Group(); self.lasers = pygame.sprite.Group()
+        self.beacons = pygame.sprite.Group(); self.obstacles = pygame.sprite.Group()
+        self.beacon_hash.clear(); self.obstacle_hash.clear(); self.static_version += 1
+        if self.particles is not None: self.particles.clear()
+        self.player.reset(); self.all_sprites.add(self.player)
+    def spawn_level(self):
+        if self.level_cache is not None: layout = self.level_cache.get(self.level)
+        else: layout = generate_layout(self.level, level_seed(self.seed, self.level), self.world_screens)
+        self.terrain = self.player.terrain = layout.terrain; self.world_width = layout.terrain.width if layout.terrain else SCREEN_WIDTH
+        self.follow_camera()
+        for center in layout.beacons: self.add_beacon(Beacon(center))
+        for x, y, radius in layout.obstacles: self.add_obstacle(Obstacle((x, y), radius))
+    def add_beacon(self, beacon):
+        self.beacons.add(beacon); self.all_sprites.add(beacon); self.beacon_hash.insert(beacon, beacon.rect); self.static_version += 1
+    def add_obstacle(self, obstacle):
+        self.obstacles.add(obstacle); self.all_sprites.add(obstacle); self.obstacle_hash.insert(obstacle, obstacle.rect); self.static_version += 1
+    def follow_camera(self):
+        self.camera.left = min(max(int(self.player.pos.x) - SCREEN_WIDTH // 2, 0), self.world_width - SCREEN_WIDTH)
+    def collide_lasers(self):
+        """Kill lasers and the beacons they hit; returns how many lasers scored a hit."""
+        lasers_hit = 0
+        for laser in self.lasers.sprites():
+            if self.terrain is not None and self.terrain.solid_at(laser.pos.x, laser.pos.y): laser.kill(); continue
+            hit = [beacon for beacon in self.beacon_hash.query(laser.rect) if laser_hits_beacon(laser, beacon)]
+            if hit:
+                lasers_hit += 1; laser.kill()
+                for beacon in hit: beacon.kill(); self.beacon_hash.remove(beacon)
+                self.static_version += 1
+        return lasers_hit
+    def collide_player(self):
+        return [obstacle for obstacle in self.obstacle_hash.query(self.player.rect) if player_hits_obstacle(self.player, obstacle)]
+    def _effect(self, create, pos, count):
+        if self.particles is not None: create(pos, count, self.particles)
+    def step(self, inputs=0):
+        """Advance the game by one SIM_DT tick."""
+        self.tick += 1; dt = SIM_DT; player = self.player; mark = self.profiler.mark
+        if self.particles is not None and self.state in (PLAYING, PLAYER_EXPLODING): self.particles.update(dt); mark("particles")
+        if self.state == PLAYING:
+            if inputs & INPUT_FIRE and self.player_alive() and not player.landed: player.shoot(self.time_ms, self.all_sprites, self.lasers, self.camera)
+            if self.player_alive():
+                if inputs & INPUT_LEFT: player.rotate(-1)
+                if inputs & INPUT_RIGHT: player.rotate(1)
+            mark("input"); player.inputs = inputs; self.update_sprites(dt); self.follow_camera(); mark("update")
+            if self.player_alive():
+                if player.just_landed: self._effect(create_smoke, (player.rect.centerx, player.rect.bottom), SMOKE_PARTICLE_COUNT)
+                if player.just_took_off: self._effect(create_smoke, (player.rect.centerx, player.rect.bottom), SMOKE_PARTICLE_COUNT)
+                mark("particles")
+            if self.player_alive():
+                beacon_hits = self.collide_lasers()
+                if beacon_hits:
+                    self.score += beacon_hits * BEACON_SCORE; log.debug("Score: %d", self.score)
+                    if self.score >= self.extra_life_threshold:
+                        self.ships += 1; self.extra_life_threshold += EXTRA_LIFE_SCORE; log.debug("Extra life! Ships: %d, next at: %d", self.ships, self.extra_life_threshold)
+                obstacle_hits = self.collide_player()
+                if obstacle_hits and not player.crashed: player.crashed = True; log.debug("Crash: hit obstacle")
+                mark("collision")
+            player_died_condition = False
+            if self.player_alive(): player_died_condition = player.crashed or (player.fuel <= 0 and not player.landed)
+            if player_died_condition:
+                if player.crashed:
+                    log.debug("Player crashed, starting explosion"); self._effect(create_explosion, player.rect.center, EXPLOSION_PARTICLE_COUNT)
+                    player.kill(); self.state = PLAYER_EXPLODING; self.death_anim_start_time = self.time_ms
+                else:
+                    log.debug("Player out of fuel mid-air")
+                    if self.ships <= 1: self.ships = 0; self.state = GAME_OVER; log.info("Game over: final ship lost (fuel)")
+                    else: self.ships -= 1; log.debug("Ship lost, %d remaining", self.ships); player.reset()
+            elif not self.beacons and self.state == PLAYING: self.state = LEVEL_COMPLETE; log.info("Level %d complete", self.level)
+            mark("collision")  # crash, fuel and level-complete outcomes settle what the collisions did
+        elif self.state == PLAYER_EXPLODING:
+            self.update_sprites(dt); mark("update")
+            if self.time_ms - self.death_anim_start_time > DEATH_ANIM_DURATION:
+                log.debug("Explosion finished")
+                if self.ships <= 1: self.ships = 0; self.state = GAME_OVER; log.info("Game over: final ship lost (crash)")
+                else:
+                    self.ships -= 1; log.debug("Ship lost, %d remaining", self.ships)
+                    self.player.reset(); self.all_sprites.add(self.player); self.state = PLAYING
+    def update_sprites(self, dt):
+        # Beacons and obstacles are static, so only the ship (while flying) and lasers need stepping.
+        if self.player_alive() and not self.player.crashed: self.player.update(dt)
+        self.lasers.update(dt)
+    def complete_level(self):
+        """Apply the end-of-level bonus and move on to the next level."""
+        self.score += LEVEL_BONUS
+        if self.score >= self.extra_life_threshold: self.ships += 1; log.debug("Extra life from level bonus! Ships: %d", self.ships)
+        self.extra_life_threshold = (self.score // EXTRA_LIFE_SCORE + 1) * EXTRA_LIFE_SCORE
+        self.start_level(self.level + 1)
+
+def random_policy(seed=None, hold_ticks=10):
+    """Mash random inputs, holding each combination for hold_ticks ticks."""
+    rng = random.Random(seed); current = [0]
+    def policy(sim):
+        if sim.tick % hold_ticks == 0: current[0] = rng.getrandbits(5)
+        return current[0]
+    return policy
+
+def run_headless(level=1, steps=SIM_HZ * 60, policy=None, effects=False, seed=None, world_screens=None):
+    """Step a Simulation without a display; policy(sim) returns the INPUT_* bits for each tick."""
+    sim = Simulation(level, effects=effects, seed=seed, world_screens=world_screens)
+    for _ in range(steps):
+        sim.step(policy(sim) if policy else 0)
+        if sim.state in (GAME_OVER, LEVEL_COMPLETE): break
+    return sim
+
+# --- Record / Replay ---
+# A session is fully determined by its seed, starting level/score/ships and the INPUT_* bits fed to
+# each step(), so a recording is just those plus one byte per tick. Level transitions need no entry:
+# complete_level() runs before the next step whenever the simulation is in LEVEL_COMPLETE.
+Replay = namedtuple("Replay", "seed level score ships world inputs final_score final_hash")
+
+def state_hash(sim):
+    """Digest of everything that decides how the session plays on; particles are excluded."""
+    player = sim.player
+    state = (sim.tick, sim.level, sim.score, sim.ships, sim.state, sim.player_alive(), tuple(player.pos), tuple(player.vel),
+             player.angle, player.fuel, player.landed, player.crashed, player.landing_gear_deployed, player.last_shot_time,
+             sorted(beacon.rect.center for beacon in sim.beacons), sorted(obstacle.rect.center for obstacle in sim.obstacles),
+             sorted((tuple(laser.pos), tuple(laser.vel)) for laser in sim.lasers))
+    return hashlib.blake2b(repr(state).encode(), digest_size=8).digest()
+
+class InputRecorder:
+    """Collects the inputs fed to a Simulation, one byte per tick."""
+    def __init__(self): self.sim = None; self.start = None; self.inputs = bytearray()
+    def attach(self, sim):
+        # Level seeds only depend on the session seed modulo 2**32 (see level_seed), so that is all we store.
+        self.sim = sim; self.start = (sim.seed & 0xFFFFFFFF, sim.level, sim.score, sim.ships, sim.world_screens or 0); self.inputs.clear()
+    def record(self, bits): self.inputs.append(bits)
+    def replay(self):
+        return Replay(*self.start, bytes(self.inputs), self.sim.score, state_hash(self.sim))
+
+def save_replay(replay, path):
+    with open(path, 'wb') as f:
+        f.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, replay.seed, replay.level, replay.score, replay.ships, replay.world,
+                                   len(replay.inputs), replay.final_score, replay.final_hash))
+        f.write(zlib.compress(replay.inputs, 9))
+
+def load_replay(path):
+    with open(path, 'rb') as f: data = f.read()
+    magic, version, seed, level, score, ships, world, ticks, final_score, final_hash = REPLAY_HEADER.unpack_from(data)
+    if magic != REPLAY_MAGIC or version != REPLAY_VERSION: raise ValueError(f"{path}: not a version {REPLAY_VERSION} recording")
+    inputs = zlib.decompress(data[REPLAY_HEADER.size:])
+    if len(inputs) != ticks: raise ValueError(f"{path}: expected {ticks} ticks of input, found {len(inputs)}")
+    return Replay(seed, level, score, ships, world, inputs, final_score, final_hash)
+
+def replay_simulation(replay, effects=False):
+    sim = Simulation(replay.level, replay.score, replay.ships, effects=effects, seed=replay.seed, world_screens=replay.world or None)
+    for bits in replay.inputs:
+        if sim.state == LEVEL_COMPLETE: sim.complete_level()
+        sim.step(bits)
+    return sim
+
+def check_replay(replay, sim):
+    """Compare a replayed session with the recording; returns a list of mismatches (empty if it reproduced)."""
+    problems = []
+    if sim.tick != len(replay.inputs): problems.append(f"ran {sim.tick} of {len(replay.inputs)} ticks")
+    if sim.score != replay.final_score: problems.append(f"score {sim.score}, recorded {replay.final_score}")
+    if state_hash(sim) != replay.final_hash: problems.append(f"state hash {state_hash(sim).hex()}, recorded {replay.final_hash.hex()}")
+    return problems
+
+# --- Snapshots ---
+# A snapshot is the whole gameplay state packed with struct: enough to resume a session exactly
+# (the terrain is regenerated from the level seed, particles are cosmetic and left out). Streams
+# send one per tick as an XOR against the previous one, which is mostly zeros and compresses to
+# a few dozen bytes; encoding happens on the game thread, everything else on a sender thread.
+SnapshotHeader = namedtuple("SnapshotHeader", "seed world tick level score ships extra_life_threshold state death_anim_start_time")
+PLAYER_FLAGS = ("alive", "landed", "crashed", "landing_gear_deployed", "thrusting", "boosting")
+
+def encode_snapshot(sim):
+    player = sim.player; flags = 0
+    for bit, value in enumerate((sim.player_alive(), player.landed, player.crashed, player.landing_gear_deployed, player.thrusting, player.boosting)):
+        if value: flags |= 1 << bit
+    obstacles = [value for obstacle in sim.obstacles for value in (*obstacle.rect.center, obstacle.radius)]
+    beacons = [value for beacon in sim.beacons for value in beacon.rect.center]
+    lasers = [value for laser in sim.lasers for value in (*laser.pos, laser.angle)]
+    return b"".join((
+        SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, sim.seed & 0xFFFFFFFF, sim.world_screens or 0, sim.tick, sim.level, sim.score,
+                             sim.ships, sim.extra_life_threshold, SIM_STATES.index(sim.state), sim.death_anim_start_time),
+        SNAPSHOT_PLAYER.pack(*player.pos, *player.vel, *player.rect.center, player.angle, player.fuel, player.last_shot_time, flags, player.inputs),
+        SNAPSHOT_COUNTS.pack(len(obstacles) // 3, len(beacons) // 2, len(lasers) // 3),
+        struct.pack(f"<{len(obstacles)}i", *obstacles), struct.pack(f"<{len(beacons)}i", *beacons),
+        struct.pack("<" + SNAPSHOT_LASER * (len(lasers) // 3), *lasers)))
+
+def snapshot_header(data):
+    magic, version, *fields = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION: raise ValueError(f"not a version {SNAPSHOT_VERSION} snapshot")
+    header = SnapshotHeader(*fields); return header._replace(state=SIM_STATES[header.state])
+
+def restore_snapshot(sim, data):
+    """Put sim into the snapshot's state. The level is only rebuilt when it differs, so applying one
+    snapshot per tick (as spectators do) only touches the player, lasers and beacons that changed."""
+    header = snapshot_header(data); offset = SNAPSHOT_HEADER.size
+    px, py, vx, vy, cx, cy, angle, fuel, last_shot_time, flags, inputs = SNAPSHOT_PLAYER.unpack_from(data, offset); offset += SNAPSHOT_PLAYER.size
+    num_obstacles, num_beacons, num_lasers = SNAPSHOT_COUNTS.unpack_from(data, offset); offset += SNAPSHOT_COUNTS.size
+    obstacles = struct.unpack_from(f"<{num_obstacles * 3}i", data, offset); offset += num_obstacles * 12
+    beacons = struct.unpack_from(f"<{num_beacons * 2}i", data, offset); offset += num_beacons * 8
+    lasers = struct.unpack_from("<" + SNAPSHOT_LASER * num_lasers, data, offset)
+    obstacles = [obstacles[i:i + 3] for i in range(0, len(obstacles), 3)]
+    if ((header.seed, header.world, header.level) != (sim.seed & 0xFFFFFFFF, sim.world_screens or 0, sim.level)
+            or obstacles != [(*obstacle.rect.center, obstacle.radius) for obstacle in sim.obstacles]):
+        sim.seed = header.seed; sim.world_screens = header.world or None; sim.level = header.level; sim.clear_level()
+        cache = sim.level_cache
+        if cache is not None and (cache.session_seed & 0xFFFFFFFF, cache.world_screens or 0) != (header.seed, header.world): sim.level_cache = None
+        sim.terrain = sim.player.terrain = Terrain(header.world * SCREEN_WIDTH, level_seed(header.seed, header.level)) if header.world else None
+        sim.world_width = sim.terrain.width if sim.terrain else SCREEN_WIDTH
+        for x, y, radius in obstacles: sim.add_obstacle(Obstacle((x, y), radius))
+    centers = [(beacons[i], beacons[i + 1]) for i in range(0, len(beacons), 2)]; wanted = set(centers)
+    for beacon in sim.beacons.sprites():
+        if beacon.rect.center not in wanted: beacon.kill(); sim.beacon_hash.remove(beacon); sim.static_version += 1
+    present = {beacon.rect.center for beacon in sim.beacons}
+    for center in centers:
+        if center not in present: sim.add_beacon(Beacon(center))
+    (sim.tick, sim.level, sim.score, sim.ships, sim.extra_life_threshold, sim.state, sim.death_anim_start_time) = header[2:]
+    player = sim.player; player.pos.update(px, py); player.vel.update(vx, vy); player.angle = angle; player.fuel = fuel
+    player.last_shot_time = last_shot_time; player.inputs = inputs
+    alive, player.landed, player.crashed, player.landing_gear_deployed, player.thrusting, player.boosting = (bool(flags >> bit & 1) for bit in range(len(PLAYER_FLAGS)))
+    player._update_rotation_visuals(); player.rect.center = (cx, cy); player.prev_center = player.rect.center
+    if alive and not sim.player_alive(): sim.all_sprites.add(player)
+    elif not alive and sim.player_alive(): player.kill()
+    sim.follow_camera()
+    for laser in sim.lasers.sprites(): laser.kill()
+    for i in range(0, len(lasers), 3):
+        laser = Laser(lasers[i:i + 2], lasers[i + 2], sim.camera); sim.lasers.add(laser); sim.all_sprites.add(laser)
+
+def simulation_from_snapshot(data, effects=True, level_cache=None):
+    header = snapshot_header(data)
+    sim = Simulation(header.level, seed=header.seed, effects=effects, level_cache=level_cache, world_screens=header.world or None)
+    restore_snapshot(sim, data); return sim
+
+def save_snapshot(data, path=SAVE_FILE):
+    try: write_atomically(path, data, ".save-")
+    except OSError as e: log.error("Error saving game: %s", e)
+
+def load_snapshot(path=SAVE_FILE):
+    with open(path, 'rb') as f: data = f.read()
+    snapshot_header(data); return data
+
+def xor_bytes(data, reference):
+    """data XOR reference, with reference cut or zero-padded to data's length. Turns a snapshot into a delta and back."""
+    reference = reference[:len(data)].ljust(len(data), b"\0")
+    return (int.from_bytes(data, "little") ^ int.from_bytes(reference, "little")).to_bytes(len(data), "little")
+
+class SnapshotStreamer:
+    """Serves the running game on a local TCP port: each spectator gets a keyframe, then a delta per tick."""
+    def __init__(self, port=STREAM_PORT, host="127.0.0.1"):
+        self.server = socket.create_server((host, port)); self.server.setblocking(False); self.port = self.server.getsockname()[1]
+        self.pending = queue.Queue(STREAM_QUEUE); self.clients = []; self.stopping = threading.Event()
+        self.ticks = 0; self.bytes_sent = 0; self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="snapshot-stream", daemon=True); self.thread.start()
+    def publish(self, sim):
+        """Queue the current state for spectators; a no-op when nobody is watching."""
+        if not self.clients: return
+        # A stalled spectator must not stall the game: drop this tick, the next delta covers it.
+        try: self.pending.put_nowait(encode_snapshot(sim))
+        except queue.Full: self.dropped += 1
+    def _run(self):
+        previous = None; fresh = set()
+        while not self.stopping.is_set():
+            try:
+                client, address = self.server.accept(); client.settimeout(STREAM_SEND_TIMEOUT)
+                client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1); fresh.add(client); self.clients.append(client)
+                log.info("Spectator connected from %s:%d", *address)
+            except BlockingIOError: pass
+            try: snapshot = self.pending.get(timeout=STREAM_POLL)
+            except queue.Empty: continue
+            packets = {}
+            for client in list(self.clients):
+                kind = STREAM_KEYFRAME if client in fresh or previous is None else STREAM_DELTA
+                if kind not in packets:
+                    payload = zlib.compress(snapshot if kind == STREAM_KEYFRAME else xor_bytes(snapshot, previous))
+                    packets[kind] = STREAM_PACKET.pack(kind, len(payload)) + payload
+                try: client.sendall(packets[kind]); self.bytes_sent += len(packets[kind]); fresh.discard(client)
+                except OSError as e: log.info("Spectator dropped: %s", e); self.clients.remove(client); fresh.discard(client); client.close()
+            previous = snapshot; self.ticks += 1
+    def close(self):
+        self.stopping.set(); self.thread.join(); self.server.close()
+        for client in self.clients: client.close()
+        self.clients = []
+
+class SnapshotReceiver:
+    """The spectator end of a SnapshotStreamer."""
+    def __init__(self, port=STREAM_PORT, host="127.0.0.1"):
+        self.socket = socket.create_connection((host, port)); self.socket.setblocking(False)
+        self.buffer = bytearray(); self.snapshot = None; self.closed = False
+    def poll(self):
+        """Snapshots that arrived since the last call, oldest first; sets closed once the game goes away."""
+        try:
+            while True:
+                chunk = self.socket.recv(65536)
+                if not chunk: self.closed = True; break
+                self.buffer += chunk
+        except BlockingIOError: pass
+        except OSError: self.closed = True
+        snapshots = []
+        while len(self.buffer) >= STREAM_PACKET.size:
+            kind, length = STREAM_PACKET.unpack_from(self.buffer); end = STREAM_PACKET.size + length
+            if len(self.buffer) < end: break
+            payload = zlib.decompress(self.buffer[STREAM_PACKET.size:end]); del self.buffer[:end]
+            self.snapshot = payload if kind == STREAM_KEYFRAME else xor_bytes(payload, self.snapshot); snapshots.append(self.snapshot)
+        return snapshots
+    def close(self): self.socket.close()
+
+# --- Batch Simulation ---
+# Many independent ships flying the Player.update rules at once, for landing bots and constant
+# sweeps. State is one NumPy array per field; there are no beacons, obstacles or lasers.
+# Rect sizes come from the rotation atlases, since the ground, wrap and gear checks depend on them.
+ShipParams = namedtuple("ShipParams", "thrust_force boost_force boost_takeoff_kick gravity friction max_speed max_fuel fuel_consumption "
+                        "boost_fuel_consumption fuel_recharge_rate landing_angle_tolerance landing_speed_tolerance gear_deploy_altitude gear_deploy_angle_tolerance")
+ShipParams.__new__.__defaults__ = (THRUST_FORCE, BOOST_FORCE, BOOST_TAKEOFF_KICK, GRAVITY, FRICTION, MAX_SPEED, MAX_FUEL, FUEL_CONSUMPTION,
+                                   BOOST_FUEL_CONSUMPTION, FUEL_RECHARGE_RATE, LANDING_ANGLE_TOLERANCE, LANDING_SPEED_TOLERANCE,
+                                   GEAR_DEPLOY_ALTITUDE, GEAR_DEPLOY_ANGLE_TOLERANCE)
+BATCH_OBS_FIELDS = ("x", "y", "vx", "vy", "angle", "fuel", "landed", "gear")
+# Same libm calls as Player, so thrust vectors match bit for bit.
+ANGLE_COS = np.array([math.cos(math.radians(angle)) for angle in range(360)])
+ANGLE_SIN = np.array([math.sin(math.radians(angle)) for angle in range(360)])
+
+def ship_size_tables():
+    """(widths, heights) of the ship's rect, indexed [gear][angle]."""
+    frames = [[ship_atlas(gear).get(angle)[1] for angle in range(360)] for gear in (False, True)]
+    return np.array([[rect.width for rect in row] for row in frames]), np.array([[rect.height for rect in row] for row in frames])
+
+def angle_off_vertical(angle): return np.abs((angle - 270 + 180) % 360 - 180)
+
+class BatchSimulator:
+    """n ships stepped together with gym-style reset()/step(). params fields may be scalars or length-n arrays."""
+    def __init__(self, n, params=None, sizes=None, autoreset=True):
+        self.n = n; self.autoreset = autoreset
+        self.params = ShipParams(*(np.broadcast_to(np.asarray(value, dtype=float), (n,)) for value in (params or ShipParams())))
+        self.widths, self.heights = sizes if sizes is not None else ship_size_tables()
+        self.x = np.zeros(n); self.y = np.zeros(n); self.vx = np.zeros(n); self.vy = np.zeros(n)
+        self.angle = np.zeros(n, dtype=np.int64); self.fuel = np.zeros(n)
+        self.landed = np.zeros(n, dtype=bool); self.crashed = np.zeros(n, dtype=bool); self.gear = np.zeros(n, dtype=bool)
+        self.done = np.zeros(n, dtype=bool); self.reset()
+    def reset(self, mask=None):
+        """Put ships (all, or where mask is set) back at the spawn point, as Player.reset does; returns observations."""
+        mask = np.ones(self.n, dtype=bool) if mask is None else mask
+        self.x[mask] = SCREEN_WIDTH // 2; self.y[mask] = SCREEN_HEIGHT // 4; self.vx[mask] = 0; self.vy[mask] = 0
+        self.angle[mask] = 270; self.fuel[mask] = self.params.max_fuel[mask]
+        for flags in (self.landed, self.crashed, self.gear, self.done): flags[mask] = False
+        return self.observe()
+    def observe(self):
+        return np.stack([self.x, self.y, self.vx, self.vy, self.angle, self.fuel, self.landed, self.gear], axis=1)
+    def step(self, actions):
+        """Advance every ship one tick on its INPUT_* bits; returns (obs, reward, done, info).
+
+        Reward is +1 for a landing and -1 for losing the ship (crash, or out of fuel in the air).
+        Finished ships are reset when autoreset is set (their last observation is in info["final_obs"]),
+        otherwise they stay frozen until reset()."""
+        actions = np.asarray(actions); p = self.params; active = ~self.done; ground_level = SCREEN_HEIGHT - GROUND_HEIGHT
+        # Simulation.step turns the ship before Player.update.
+        turning = active & ~self.landed
+        self.angle = np.where(turning & (actions & INPUT_LEFT > 0), (self.angle - ROTATION_SPEED) % 360, self.angle)
+        self.angle = np.where(turning & (actions & INPUT_RIGHT > 0), (self.angle + ROTATION_SPEED) % 360, self.angle)
+        x, y, vx, vy, angle, fuel, landed, gear = self.x, self.y, self.vx, self.vy, self.angle, self.fuel, self.landed, self.gear
+        height = self.heights[gear.astype(np.int64), angle]
+        should_deploy = (ground_level - (y + height / 2) <= p.gear_deploy_altitude) & (angle_off_vertical(angle) <= p.gear_deploy_angle_tolerance) & ~landed
+        gear = np.where(active, should_deploy, gear)
+        thrust = active & (actions & INPUT_THRUST > 0) & (fuel > 0); boost_input = actions & INPUT_BOOST > 0
+        boosting = thrust & boost_input & (fuel >= p.boost_fuel_consumption)
+        thrusting = thrust & ~boost_input & ~landed & (fuel >= p.fuel_consumption)
+        fuel = np.where(boosting, fuel - p.boost_fuel_consumption, np.where(thrusting, fuel - p.fuel_consumption, fuel))
+        took_off = boosting & landed
+        vy = np.where(took_off, vy - p.boost_takeoff_kick, vy); landed = landed & ~took_off; gear = gear & ~took_off
+        force = np.where(boosting & ~took_off, p.boost_force, np.where(thrusting, p.thrust_force, 0.0)); pushed = force != 0
+        vx = np.where(pushed, vx + ANGLE_COS[angle] * force, vx); vy = np.where(pushed, vy + ANGLE_SIN[angle] * force, vy)
+        flying = active & ~landed
+        vy = np.where(flying, vy + p.gravity, vy)
+        vx = np.where(flying, vx * p.friction, vx); vy = np.where(flying, vy * p.friction, vy)
+        speed = np.sqrt(vx * vx + vy * vy); too_fast = active & (speed > p.max_speed)
+        scale = np.where(too_fast, p.max_speed / np.where(too_fast, speed, 1.0), 1.0)
+        vx = np.where(too_fast, vx * scale, vx); vy = np.where(too_fast, vy * scale, vy)
+        x = np.where(flying, x + vx, x); y = np.where(flying, y + vy, y)
+        width = self.widths[gear.astype(np.int64), angle]; height = self.heights[gear.astype(np.int64), angle]
+        on_ground = active & (y + height / 2 >= ground_level)
+        x = np.where(active & (x > SCREEN_WIDTH + width / 2), -width / 2, np.where(active & (x < -width / 2), SCREEN_WIDTH + width / 2, x))
+        y = np.where(active & (y < height / 2), height / 2, y); vy = np.where(active & (vy < 0), 0.0, vy)
+        touching = on_ground & ~landed
+        gentle = (angle_off_vertical(angle) <= p.landing_angle_tolerance) & (np.sqrt(vx * vx + vy * vy) <= p.landing_speed_tolerance)
+        just_landed = touching & gentle; crashed = self.crashed | (touching & ~gentle)
+        y = np.where(just_landed, ground_level - height / 2, y); vx = np.where(just_landed, 0.0, vx); vy = np.where(just_landed, 0.0, vy)
+        angle = np.where(just_landed, 270, angle); landed = landed | just_landed; gear = gear | just_landed
+        fuel = np.where(on_ground & landed, fuel + p.fuel_recharge_rate, fuel); fuel = np.where(on_ground & (fuel > p.max_fuel), p.max_fuel, fuel)
+        self.x, self.y, self.vx, self.vy, self.angle, self.fuel, self.landed, self.gear, self.crashed = x, y, vx, vy, angle, fuel, landed, gear, crashed
+        # Simulation.step's death rule: a crash, or an empty tank in the air.
+        lost = active & (crashed | ((fuel <= 0) & ~landed)); self.done = self.done | lost
+        reward = just_landed.astype(float) - lost; obs = self.observe()
+        info = {"landed": just_landed, "lost": lost, "took_off": took_off}
+        if self.autoreset and lost.any(): info["final_obs"] = obs; obs = self.reset(lost)
+        return obs, reward, self.done.copy() | lost, info
+
+def landing_policy(obs, rng):
+    """A noisy hover-down controller: point up, thrust when falling too fast, occasionally mash random keys."""
+    angle = obs[:, 4]; vy = obs[:, 3]; off = (angle - 270 + 180) % 360 - 180
+    bits = np.where(off > 0, INPUT_LEFT, np.where(off < 0, INPUT_RIGHT, 0)) | np.where(vy > 0.8, INPUT_THRUST, 0)
+    bits = np.where(obs[:, 6] > 0, np.where(rng.random(len(obs)) < 0.02, INPUT_THRUST | INPUT_BOOST, 0), bits)
+    return np.where(rng.random(len(obs)) < 0.1, rng.integers(0, 16, len(obs)), bits)
+
+def _run_batch(n, params, sizes, ticks, policy, seed):
+    sim = BatchSimulator(n, params, sizes); rng = np.random.default_rng(seed); obs = sim.observe()
+    landings = np.zeros(n, dtype=np.int64); losses = np.zeros(n, dtype=np.int64)
+    for _ in range(ticks):
+        obs, reward, done, info = sim.step(policy(obs, rng)); landings += info["landed"]; losses += info["lost"]
+    return landings.sum(), losses.sum()
+
+def sweep(param_sets, ships=1024, ticks=SIM_HZ * 60, policy=landing_policy, seed=0, workers=None):
+    """Fly `ships` ships per ShipParams in param_sets across a process pool; returns (landings, losses) per set.
+
+    policy(obs, rng) -> INPUT_* bits must be a module-level function so it can be sent to the workers."""
+    sizes = ship_size_tables()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_batch, ships, params, sizes, ticks, policy, seed + i) for i, params in enumerate(param_sets)]
+        return [future.result() for future in futures]
+
+# --- Rendering ---
+def interpolated_rect(sprite, alpha):
+    rect = sprite.rect; prev = getattr(sprite, 'prev_center', None)
+    if prev is None or alpha >= 1 or prev == rect.center: return rect
+    # Screen wrap teleports the ship; don't smear it across the screen for a frame.
+    if abs(rect.centerx - prev[0]) > SCREEN_WIDTH / 2 or abs(rect.centery - prev[1]) > SCREEN_HEIGHT / 2: return rect
+    rect = rect.copy(); rect.center = (prev[0] + (rect.centerx - prev[0]) * alpha, prev[1] + (rect.centery - prev[1]) * alpha)
+    return rect
+
+def draw_static_layer(surface, sim):
+    surface.fill(BLACK)
+    ground_rect = pygame.Rect(0, SCREEN_HEIGHT - GROUND_HEIGHT, SCREEN_WIDTH, GROUND_HEIGHT); pygame.draw.rect(surface, GREEN, ground_rect)
+    surface.blits([(sprite.image, sprite.rect) for group in (sim.beacons, sim.obstacles) for sprite in group], doreturn=False)
+
+def draw_dynamic(surface, sim, alpha=1.0, camera_x=0):
+    """Draw the ship, lasers, particles and flame; returns the rects drawn to."""
+    player = sim.player; player_is_alive = sim.player_alive()
+    moving = ([player] if player_is_alive else []) + sim.lasers.sprites()
+    drawn = surface.blits([(sprite.image, interpolated_rect(sprite, alpha).move(-camera_x, 0)) for sprite in moving])
+    if sim.particles is not None:
+        particle_rect = sim.particles.draw(surface, alpha, camera_x)
+        if particle_rect is not None: drawn.append(particle_rect)
+    flame = flame_position(sim, alpha, camera_x)
+    if flame is not None: drawn.append(pygame.draw.circle(surface, RED, flame, FLAME_RADIUS))
+    return drawn
+
+def flame_position(sim, alpha=1.0, camera_x=0):
+    """Screen position of the thrust flame behind the ship, or None when it isn't burning."""
+    player = sim.player
+    if not (sim.player_alive() and (player.thrusting or player.boosting) and not player.crashed): return None
+    rad_angle = math.radians(player.angle); flame_offset_dist = 12
+    draw_center = interpolated_rect(player, alpha).move(-camera_x, 0).center; offset = player.pos - pygame.Vector2(player.rect.center)
+    flame_pos_x = draw_center[0] + offset.x - flame_offset_dist * math.cos(rad_angle); flame_pos_y = draw_center[1] + offset.y - flame_offset_dist * math.sin(rad_angle)
+    return int(flame_pos_x), int(flame_pos_y)
+
+def hud_values(sim):
+    player = sim.player; player_is_alive = sim.player_alive()
+    current_fuel = player.fuel if player_is_alive else 0; current_angle = player.angle if player_is_alive else 0; is_landed = player.landed if player_is_alive else False
+    return current_fuel, current_angle, is_landed, len(sim.beacons), sim.score, sim.level, sim.ships
+
+def camera_x(sim, alpha=1.0):
+    """Left edge of the view, following the ship between ticks like the sprites do (0 on classic levels)."""
+    if sim.terrain is None or not sim.player_alive(): return sim.camera.left
+    return min(max(interpolated_rect(sim.player, alpha).centerx - SCREEN_WIDTH // 2, 0), sim.world_width - SCREEN_WIDTH)
+
+def draw_world(surface, sim, alpha=1.0):
+    """Draw a scrolling level. Only terrain chunks and beacons/obstacles inside the view are touched,
+    so the cost doesn't depend on how big the world is."""
+    left = camera_x(sim, alpha); view = pygame.Rect(left, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+    surface.fill(BLACK); sim.terrain.draw(surface, left)
+    surface.blits([(sprite.image, sprite.rect.move(-left, 0)) for spatial_hash in (sim.beacon_hash, sim.obstacle_hash)
+                   for sprite in spatial_hash.query(view)], doreturn=False)
+    draw_dynamic(surface, sim, alpha, left)
+
+def draw_scene(surface, sim, alpha=1.0):
+    if sim.terrain is not None: draw_world(surface, sim, alpha)
+    else: draw_static_layer(surface, sim); draw_dynamic(surface, sim, alpha)
+
+def draw_game(screen, sim, hud, alpha=1.0):
+    """Draw the current simulation state in full, blending moving sprites between the last two ticks."""
+    draw_scene(screen, sim, alpha); hud.draw(screen, *hud_values(sim))
+
+class GameRenderer:
+    """Draws a Simulation and pushes it to the display.
+
+    By default the static layer (ground, beacons, obstacles) is cached. Each frame only the areas under
+    last frame's moving sprites and HUD are restored from it, the moving sprites and then the HUD's
+    cached text are drawn, and just those rects go to display.update(). full_redraw=True falls back to
+    redrawing everything and flipping the whole screen."""
+    def __init__(self, screen, hud, full_redraw=False, profiler=NULL_PROFILER):
+        self.screen = screen; self.hud = hud; self.full_redraw = full_redraw; self.profiler = profiler
+        self.static_layer = pygame.Surface(screen.get_size())
+        self.shade = pygame.Surface(screen.get_size(), pygame.SRCALPHA); self.shade.fill(MESSAGE_SHADE)
+        self.static_version = None; self.last_rects = []
+    def invalidate(self): self.static_version = None
+    def set_caption(self, text): pygame.display.set_caption(text)
+    def refresh(self): pygame.display.flip()
+    def show_message(self, title, color, subtitle, subtitle_size):
+        """Dim the frame just drawn, put a message over it and show it (game over / level complete)."""
+        self.screen.blit(self.shade, (0, 0))
+        draw_text(self.screen, title, 64, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 4, color)
+        draw_text(self.screen, subtitle, subtitle_size, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
+        pygame.display.flip()
+    def draw_overlays(self):
+        # The profiler overlay is drawn last and restored like a moving sprite, so toggling it off leaves no trace.
+        return self.profiler.draw_overlay(self.screen)
+    def draw_hud(self):
+        # Drawn over the sprites every frame, as a full redraw does, and restored like them next frame so
+        # antialiased text is never blended onto itself. The fields are cached surfaces, so this is a few blits.
+        self.hud.blit(self.screen); return [rect for rect in self.hud.rects() if rect]
+    def draw(self, sim, alpha=1.0):
+        """Draw a frame; returns the rects to update, or None if the whole screen changed."""
+        screen = self.screen; mark = self.profiler.mark
+        if self.full_redraw or sim.terrain is not None:
+            # A scrolling view changes everywhere whenever the camera moves, so there is nothing to cache.
+            draw_scene(screen, sim, alpha); mark("draw")
+            self.hud.draw(screen, *hud_values(sim)); self.draw_overlays(); mark("hud"); return None
+        # Last frame's rects already cover wherever HUD text was, so the rects Hud.update reports aren't needed.
+        self.hud.update(*hud_values(sim))
+        if sim.static_version != self.static_version:
+            self.static_version = sim.static_version; draw_static_layer(self.static_layer, sim)
+            screen.blit(self.static_layer, (0, 0)); self.last_rects = draw_dynamic(screen, sim, alpha); mark("draw")
+            self.last_rects += self.draw_hud() + self.draw_overlays(); mark("hud")
+            return None
+        dirty = self.last_rects
+        for rect in dirty: screen.blit(self.static_layer, rect, rect)
+        self.last_rects = draw_dynamic(screen, sim, alpha); mark("draw")
+        self.last_rects += self.draw_hud() + self.draw_overlays(); mark("hud")
+        return dirty + self.last_rects
+    def present(self, rects):
+        if rects is None: pygame.display.flip()
+        else: pygame.display.update(rects)
+
+# --- SDL2 Texture Backend ---
+# Optional (--renderer sdl2): draws through pygame._sdl2.video, so blending and scaling run on
+# the GPU when there is one (SDL's software render driver otherwise). Sprite frames, particle
+# stamps and the flame live in one atlas texture, which lets SDL batch the copies; particle fade
+# is the texture's alpha modulation rather than a pre-faded stamp per alpha level. Text goes
+# through a software HUD layer that is uploaded only where it changed. The game logic and the
+# software GameRenderer don't know this exists. pygame._sdl2 is experimental and not in every
+# pygame build, so it is only imported when a TextureBackend is created.
+class TextureAtlas:
+    """Surfaces packed into one texture in shelves, added the first time each key is drawn."""
+    def __init__(self, renderer, size=TEXTURE_ATLAS_SIZE):
+        from pygame._sdl2 import video as sdl2_video
+        self.size = size; self.regions = {}; self.x = self.y = self.shelf_height = 0
+        self.texture = sdl2_video.Texture(renderer, (size, size)); self.texture.blend_mode = pygame.BLENDMODE_BLEND
+    def region(self, key, make_surface):
+        rect = self.regions.get(key)
+        if rect is None:
+            surface = make_surface(); width, height = surface.get_size()
+            if self.x + width > self.size: self.x = 0; self.y += self.shelf_height + 1; self.shelf_height = 0
+            if self.y + height > self.size: raise RuntimeError(f"texture atlas full ({len(self.regions)} regions)")
+            rect = self.regions[key] = pygame.Rect(self.x, self.y, width, height); self.texture.update(surface, rect)
+            self.x += width + 1; self.shelf_height = max(self.shelf_height, height)
+        return rect
+    def draw(self, key, make_surface, dest, alpha=255):
+        if self.texture.alpha != alpha: self.texture.alpha = alpha
+        self.texture.draw(self.region(key, make_surface), dest)
+
+def sprite_atlas_key(sprite):
+    # Rotation frames are cached forever, so their identity is a stable key; beacons and obstacles
+    # are rebuilt every level, so they're keyed by what they look like.
+    if isinstance(sprite, Beacon): return ("beacon",)
+    if isinstance(sprite, Obstacle): return ("obstacle", sprite.radius)
+    return ("frame", id(sprite.image))
+
+def make_flame_image():
+    image = pygame.Surface((FLAME_RADIUS * 2 + 1, FLAME_RADIUS * 2 + 1), pygame.SRCALPHA)
+    pygame.draw.circle(image, RED, (FLAME_RADIUS, FLAME_RADIUS), FLAME_RADIUS); return image
+
+class TextureBackend:
+    """The window, renderer and atlas for --renderer sdl2. The output is scaled from SCREEN_WIDTH x
+    SCREEN_HEIGHT to whatever size the window is; `screen` is a software canvas for the menu."""
+    def __init__(self, window_size=(SCREEN_WIDTH, SCREEN_HEIGHT)):
+        from pygame._sdl2 import video as sdl2_video  # ImportError here means this pygame has no SDL2 texture API
+        self.video = sdl2_video; self.window = sdl2_video.Window("PyThrust II", window_size, resizable=True)
+        self.renderer = sdl2_video.Renderer(self.window); self.renderer.logical_size = (SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.atlas = TextureAtlas(self.renderer); self.screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.screen_texture = sdl2_video.Texture(self.renderer, self.screen.get_size())
+    def present_screen(self):
+        self.screen_texture.update(self.screen); self.renderer.draw_color = pygame.Color(BLACK); self.renderer.clear()
+        self.screen_texture.draw(); self.renderer.present()
+    def close(self):
+        # Textures must go before their renderer, and all of it before pygame.quit(), or SDL crashes freeing them.
+        self.atlas = self.screen_texture = None; self.renderer = self.window = None
+
+class TextureRenderer:
+    """GameRenderer's interface on a TextureBackend. Every frame is redrawn from the atlas, which is cheap on a GPU."""
+    def __init__(self, backend, hud, profiler=NULL_PROFILER):
+        self.backend = backend; self.renderer = backend.renderer; self.atlas = backend.atlas; self.hud = hud; self.profiler = profiler
+        self.hud_layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        self.video = backend.video; self.hud_texture = self.video.Texture(self.renderer, self.hud_layer.get_size()); self.hud_texture.blend_mode = pygame.BLENDMODE_BLEND
+        self.overlay_rects = []; self.hud_rects = []; self.terrain = None; self.terrain_chunks = OrderedDict()
+    def invalidate(self): pass
+    def set_caption(self, text): self.backend.window.title = text
+    def refresh(self): self.renderer.present()
+    def draw_sprite(self, sprite, dest): self.atlas.draw(sprite_atlas_key(sprite), lambda: sprite.image, dest)
+    def draw_terrain(self, terrain, left):
+        if terrain is not self.terrain: self.terrain = terrain; self.terrain_chunks.clear()
+        first = left // TERRAIN_CHUNK_WIDTH; last = min((left + SCREEN_WIDTH - 1) // TERRAIN_CHUNK_WIDTH, (terrain.width - 1) // TERRAIN_CHUNK_WIDTH)
+        for index in range(first, last + 1):
+            texture = self.terrain_chunks.get(index)
+            if texture is None:
+                texture = self.terrain_chunks[index] = self.video.Texture.from_surface(self.renderer, terrain.chunk(index))
+                texture.blend_mode = pygame.BLENDMODE_NONE  # drawn first, onto black: the clear sky can just be copied
+                if len(self.terrain_chunks) > TERRAIN_CHUNK_CACHE: self.terrain_chunks.popitem(last=False)
+            else: self.terrain_chunks.move_to_end(index)
+            texture.draw(None, (index * TERRAIN_CHUNK_WIDTH - left, 0))
+    def draw_hud(self, sim):
+        # The layer is redrawn in software like GameRenderer's HUD, but only the rects that changed are uploaded
+        # and only the rects with something in them are drawn.
+        dirty = self.hud.update(*hud_values(sim))
+        if dirty or self.overlay_rects or getattr(self.profiler, "show_overlay", False):
+            layer = self.hud_layer; layer.fill((0, 0, 0, 0), self.hud.area().unionall(dirty + self.overlay_rects))
+            self.hud.blit(layer); overlay_rects = self.profiler.draw_overlay(layer)
+            for rect in dirty + self.overlay_rects + overlay_rects:
+                rect = rect.clip(layer.get_rect())
+                if rect: self.hud_texture.update(layer.subsurface(rect), rect)
+            self.overlay_rects = overlay_rects
+            self.hud_rects = [rect for rect in self.hud.rects() + overlay_rects if rect]
+        for rect in self.hud_rects: self.hud_texture.draw(rect, rect)
+    def draw(self, sim, alpha=1.0):
+        """Draw a frame into the renderer's back buffer; like a full redraw, returns None."""
+        renderer = self.renderer; atlas = self.atlas; mark = self.profiler.mark
+        renderer.draw_color = pygame.Color(BLACK); renderer.clear(); left = camera_x(sim, alpha)
+        if sim.terrain is not None:
+            self.draw_terrain(sim.terrain, left); view = pygame.Rect(left, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+            static = [sprite for spatial_hash in (sim.beacon_hash, sim.obstacle_hash) for sprite in spatial_hash.query(view)]
+        else:
+            renderer.draw_color = pygame.Color(GREEN); renderer.fill_rect(pygame.Rect(0, SCREEN_HEIGHT - GROUND_HEIGHT, SCREEN_WIDTH, GROUND_HEIGHT))
+            static = sim.beacons.sprites() + sim.obstacles.sprites()
+        for sprite in static: self.draw_sprite(sprite, sprite.rect.move(-left, 0))
+        for sprite in ([sim.player] if sim.player_alive() else []) + sim.lasers.sprites(): self.draw_sprite(sprite, interpolated_rect(sprite, alpha).move(-left, 0))
+        if sim.particles is not None and sim.particles.count:
+            for size, color, level, x, y in zip(*(column.tolist() for column in sim.particles.stamps(alpha, left))):
+                atlas.draw(("particle", size, color), lambda: get_particle_base(size, color), (x, y, max(1, size), max(1, size)), particle_alpha(level))
+        flame = flame_position(sim, alpha, left)
+        if flame is not None: atlas.draw(("flame",), make_flame_image, (flame[0] - FLAME_RADIUS, flame[1] - FLAME_RADIUS, FLAME_RADIUS * 2 + 1, FLAME_RADIUS * 2 + 1))
+        mark("draw"); self.draw_hud(sim); mark("hud")
+        return None
+    def present(self, rects): self.renderer.present()
+    def show_message(self, title, color, subtitle, subtitle_size):
+        renderer = self.renderer; renderer.draw_blend_mode = pygame.BLENDMODE_BLEND
+        renderer.draw_color = pygame.Color(MESSAGE_SHADE); renderer.fill_rect(pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT))
+        for text, size, text_color, y in ((title, 64, color, SCREEN_HEIGHT / 4), (subtitle, subtitle_size, WHITE, SCREEN_HEIGHT / 2)):
+            surface = text_cache.render(text, size, text_color)
+            self.video.Texture.from_surface(renderer, surface).draw(None, align_rect(surface.get_rect(), SCREEN_WIDTH / 2, y, "midtop"))
+        renderer.present()
+
 # --- Menu Function ---
-# (show_menu unchanged)
-def show_menu(screen, clock, font_small, font_large, high_scores, last_score):
-    menu_running = True
-    while menu_running:
+def show_menu(screen, clock, font_small, font_large, high_scores, last_score, max_frames=None, present=pygame.display.flip):
+    menu_running = True; frames = 0
+    while menu_running and frames != max_frames:
         clock.tick(60)
         for event in pygame.event.get():
             if event.type == pygame.QUIT: return 'QUIT'
@@ -304,143 +1511,228 @@ def show_menu(screen, clock, font_small, font_large, high_scores, last_score):
                 score_text = f"{i+1}. {score_val}"; color = YELLOW if score_val == last_score and last_score > 0 else WHITE
                 draw_text(screen, score_text, 18, SCREEN_WIDTH / 2, hs_y + 30 + i * 25, color)
         draw_text(screen, "Press Enter to Start", 28, SCREEN_WIDTH / 2, SCREEN_HEIGHT * 0.9, ORANGE)
-        pygame.display.flip()
+        present(); frames += 1
     return 'QUIT'
 
 
+# --- Spectator ---
+def spectator_effects(sim, previous_state, was_landed):
+    """Snapshots carry no particles, so spawn them from the state changes that caused them in the game."""
+    if sim.state in (PLAYING, PLAYER_EXPLODING): sim.particles.update(SIM_DT)
+    if previous_state == PLAYING and sim.state == PLAYER_EXPLODING: create_explosion(sim.player.rect.center, EXPLOSION_PARTICLE_COUNT, sim.particles)
+    elif sim.player_alive() and sim.player.landed != was_landed: create_smoke(sim.player.rect.midbottom, SMOKE_PARTICLE_COUNT, sim.particles)
+
+def spectate(screen, clock, ship_icon_surf, port=STREAM_PORT, full_redraw=False, backend=None):
+    """Follow a game streamed with --stream until it stops or Escape is pressed; returns an exit code."""
+    try: receiver = SnapshotReceiver(port)
+    except OSError as e: log.error("No game streaming on port %d: %s", port, e); return 1
+    hud = Hud(ship_icon_surf); sim = None
+    renderer = TextureRenderer(backend, hud) if backend is not None else GameRenderer(screen, hud, full_redraw)
+    renderer.set_caption("PyThrust - Spectating")
+    try:
+        while not receiver.closed:
+            clock.tick(60)
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE): return 0
+            for snapshot in receiver.poll():
+                if sim is None: sim = simulation_from_snapshot(snapshot); continue
+                previous_state, was_landed = sim.state, sim.player.landed
+                restore_snapshot(sim, snapshot); spectator_effects(sim, previous_state, was_landed)
+            if sim is not None: renderer.present(renderer.draw(sim))
+        log.info("Stream ended")
+    finally: receiver.close()
+    return 0
+
 # --- Game Loop Function ---
-# (game_loop unchanged)
-def game_loop(screen, clock, font_small, font_large, ship_icon_surf, start_level=1, initial_score=0, start_ships=INITIAL_SHIPS):
-    level = start_level; score = initial_score; ships = start_ships
-    extra_life_threshold = (initial_score // EXTRA_LIFE_SCORE + 1) * EXTRA_LIFE_SCORE
-    pygame.display.set_caption(f"PyThrust - Level {level}")
-    player = Player(); all_sprites = pygame.sprite.Group(); lasers = pygame.sprite.Group()
-    beacons = pygame.sprite.Group(); obstacles = pygame.sprite.Group(); all_sprites.add(player)
-    num_beacons_this_level = NUM_BEACONS_BASE + level - 1; num_obstacles_this_level = 0
-    if level >= 2: num_obstacles_this_level = (level - 1) * NUM_OBSTACLES_PER_LEVEL
-    spawn_avoid_group = pygame.sprite.Group(player); beacon_spawn_attempts = 0
-    while len(beacons) < num_beacons_this_level and beacon_spawn_attempts < 200:
-        bx = random.randrange(BEACON_RADIUS, SCREEN_WIDTH - BEACON_RADIUS); by = random.randrange(BEACON_RADIUS, SCREEN_HEIGHT - GROUND_HEIGHT - BEACON_RADIUS * 4)
-        new_beacon = Beacon((bx, by));
-        if not pygame.sprite.spritecollide(new_beacon, spawn_avoid_group, False):
-             beacons.add(new_beacon); all_sprites.add(new_beacon); spawn_avoid_group.add(new_beacon)
-        beacon_spawn_attempts += 1
-    if len(beacons) < num_beacons_this_level: print(f"Warning: Could only spawn {len(beacons)} beacons.")
-    obstacle_spawn_attempts = 0
-    while len(obstacles) < num_obstacles_this_level and obstacle_spawn_attempts < 200:
-         orad = random.randint(OBSTACLE_RADIUS_MIN, OBSTACLE_RADIUS_MAX)
-         ox = random.randrange(orad, SCREEN_WIDTH - orad); oy = random.randrange(orad, SCREEN_HEIGHT - GROUND_HEIGHT - orad * 2)
-         new_obstacle = Obstacle((ox, oy), orad)
-         if not pygame.sprite.spritecollide(new_obstacle, spawn_avoid_group, False, pygame.sprite.collide_circle):
-              obstacles.add(new_obstacle); all_sprites.add(new_obstacle); spawn_avoid_group.add(new_obstacle)
-         obstacle_spawn_attempts += 1
-    if len(obstacles) < num_obstacles_this_level: print(f"Warning: Could only spawn {len(obstacles)} obstacles.")
-    game_state = PLAYING; death_anim_start_time = 0
+def game_loop(screen, clock, font_small, font_large, ship_icon_surf, start_level=1, initial_score=0, start_ships=INITIAL_SHIPS, level_cache=None, full_redraw=False, profiler=NULL_PROFILER, recorder=None, replay=None, backend=None,
+              streamer=None, save_writer=None, snapshot=None):
+    """Play one game; with a replay, its recorded inputs drive the ship in real time instead of the keyboard.
+    snapshot resumes a saved game; with a save_writer, F5 saves the game and F9 goes back to the last save."""
+    if replay is not None: start_level, initial_score, start_ships = replay.level, replay.score, replay.ships
+    sim = Simulation(start_level, initial_score, start_ships, seed=replay.seed if replay else None, level_cache=level_cache, profiler=profiler)
+    if snapshot is not None: restore_snapshot(sim, snapshot)
+    hud = Hud(ship_icon_surf); replay_inputs = iter(replay.inputs) if replay is not None else None
+    if recorder is not None: recorder.attach(sim)
+    renderer = TextureRenderer(backend, hud, profiler) if backend is not None else GameRenderer(screen, hud, full_redraw, profiler)
+    renderer.set_caption(f"PyThrust - Level {sim.level}")
+    accumulator = 0.0; fire_pressed = False; load_pressed = False; saved = None
+    # GAME_OVER / LEVEL_COMPLETE show a timed overlay while events keep flowing; Enter skips it.
+    overlay_until = None
     running = True
     while running:
-        dt = clock.tick(60) / 1000.0
+        frame_time = min(clock.tick(60) / 1000.0, MAX_FRAME_TIME); skip_overlay = False; profiler.begin_frame()
         for event in pygame.event.get():
-            if event.type == pygame.QUIT: return score
+            if event.type == pygame.QUIT: return sim.score
+            if event.type == pygame.WINDOWEXPOSED and overlay_until is not None: renderer.refresh()
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE: return score
-                if event.key == pygame.K_SPACE and game_state == PLAYING and player.groups() and not player.landed: player.shoot(all_sprites, lasers)
-        if game_state == PLAYING and player.groups():
-            keys = pygame.key.get_pressed()
-            if keys[pygame.K_LEFT] or keys[pygame.K_a]: player.rotate(-1)
-            if keys[pygame.K_RIGHT] or keys[pygame.K_d]: player.rotate(1)
-        if game_state == PLAYING:
-            if not player.crashed: all_sprites.update(dt)
+                if event.key == pygame.K_ESCAPE: return sim.score
+                if event.key == pygame.K_F2: hud.toggle_cache_stats()
+                if event.key == pygame.K_F3: profiler.show_overlay = not profiler.show_overlay
+                if event.key == pygame.K_SPACE: fire_pressed = True
+                if event.key in (pygame.K_RETURN, pygame.K_KP_ENTER): skip_overlay = True
+                if event.key == pygame.K_F5 and save_writer is not None and sim.state in (PLAYING, PLAYER_EXPLODING):
+                    saved = encode_snapshot(sim); save_writer.save(saved); log.info("Saved level %d, tick %d (%d bytes)", sim.level, sim.tick, len(saved))
+                if event.key == pygame.K_F9 and save_writer is not None: load_pressed = True
+        if overlay_until is not None:
+            if skip_overlay or pygame.time.get_ticks() >= overlay_until:
+                if sim.state == GAME_OVER: return sim.score
+                sim.complete_level(); renderer.set_caption(f"PyThrust - Level {sim.level}")
+                overlay_until = None; accumulator = 0.0; fire_pressed = False; renderer.invalidate()
+            continue
+        if load_pressed:
+            load_pressed = False
+            # A recording can only start from a fresh level, so loading would make it unplayable.
+            if recorder is not None: log.warning("Loading a save is disabled while recording")
             else:
-                 if player.groups():
-                     for sprite in all_sprites:
-                         if sprite != player: sprite.update(dt)
-                 else: all_sprites.update(dt)
-            if player.groups():
-                if player.just_landed: create_smoke((player.rect.centerx, player.rect.bottom), SMOKE_PARTICLE_COUNT, all_sprites)
-                if player.just_took_off: create_smoke((player.rect.centerx, player.rect.bottom), SMOKE_PARTICLE_COUNT, all_sprites)
-            if player.groups():
-                beacon_hits = pygame.sprite.groupcollide(lasers, beacons, True, True)
-                if beacon_hits:
-                    score += len(beacon_hits) * BEACON_SCORE; print(f"Score: {score}")
-                    if score >= extra_life_threshold: ships += 1; extra_life_threshold += EXTRA_LIFE_SCORE; print(f"Extra life! Ships: {ships}, Next at: {extra_life_threshold}")
-                obstacle_hits = pygame.sprite.spritecollide(player, obstacles, False, pygame.sprite.collide_mask)
-                if obstacle_hits and not player.crashed: player.crashed = True; print("CRASH! Hit obstacle.")
-            player_is_alive = player.groups() is not None and len(player.groups()) > 0
-            player_died_condition = False
-            if player_is_alive: player_died_condition = player.crashed or (player.fuel <= 0 and not player.landed)
-            if player_died_condition:
-                if player.crashed:
-                    print("Player crashed, starting explosion."); create_explosion(player.rect.center, EXPLOSION_PARTICLE_COUNT, all_sprites)
-                    player.kill(); game_state = PLAYER_EXPLODING; death_anim_start_time = pygame.time.get_ticks()
-                else:
-                    print("Player out of fuel mid-air.")
-                    if ships <= 1: ships = 0; game_state = GAME_OVER; print("GAME OVER - Final ship lost (fuel).")
-                    else: ships -= 1; print(f"Ship lost! Ships remaining: {ships}"); player.reset()
-            elif not beacons and game_state == PLAYING: game_state = LEVEL_COMPLETE; print("Level Complete!")
-        elif game_state == PLAYER_EXPLODING:
-            all_sprites.update(dt)
-            if pygame.time.get_ticks() - death_anim_start_time > DEATH_ANIM_DURATION:
-                print("Explosion finished.")
-                if ships <= 1: ships = 0; game_state = GAME_OVER; print("GAME OVER - Final ship lost (crash).")
+                try: saved = saved or load_snapshot(save_writer.path)
+                except (OSError, ValueError) as e: log.error("Can't load %s: %s", save_writer.path, e)
                 else:
-                    ships -= 1; print(f"Ship lost! Ships remaining: {ships}")
-                    player = Player(); all_sprites.add(player); game_state = PLAYING
-        screen.fill(BLACK)
-        ground_rect = pygame.Rect(0, SCREEN_HEIGHT - GROUND_HEIGHT, SCREEN_WIDTH, GROUND_HEIGHT); pygame.draw.rect(screen, GREEN, ground_rect)
-        all_sprites.draw(screen)
-        player_is_alive = player.groups() is not None and len(player.groups()) > 0
-        if player_is_alive and (player.thrusting or player.boosting) and not player.crashed:
-            flame_color = RED; rad_angle = math.radians(player.angle); flame_offset_dist = 12
-            flame_pos_x = player.pos.x - flame_offset_dist * math.cos(rad_angle); flame_pos_y = player.pos.y - flame_offset_dist * math.sin(rad_angle)
-            pygame.draw.circle(screen, flame_color, (int(flame_pos_x), int(flame_pos_y)), 4)
-        current_fuel = player.fuel if player_is_alive else 0; current_angle = player.angle if player_is_alive else 0; is_landed = player.landed if player_is_alive else False
-        draw_gauge(screen, 10, 10, 100, 15, current_fuel, MAX_FUEL, ORANGE, "Fuel")
-        angle_text = f"Angle: {current_angle:.0f}"; draw_text(screen, angle_text, 18, SCREEN_WIDTH / 2, 10)
-        status_text = "Landed" if is_landed else ""; draw_text(screen, status_text, 18, SCREEN_WIDTH / 2, 30, YELLOW if is_landed else RED)
-        draw_text(screen, f"Beacons: {len(beacons)}", 18, SCREEN_WIDTH - 10, 10, align="topright")
-        draw_text(screen, f"Score: {score}", 18, SCREEN_WIDTH - 10, 30, align="topright")
-        draw_text(screen, f"Level: {level}", 18, SCREEN_WIDTH - 10, 50, align="topright")
-        ship_icon_rect = ship_icon_surf.get_rect(topright=(SCREEN_WIDTH - 35, 70)); screen.blit(ship_icon_surf, ship_icon_rect)
-        draw_text(screen, f"x {ships}", 18, SCREEN_WIDTH - 10, 70, align="topright")
-        if game_state == GAME_OVER:
-             overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA); overlay.fill((0, 0, 0, 180)); screen.blit(overlay, (0,0))
-             draw_text(screen, "GAME OVER", 64, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 4, RED)
-             draw_text(screen, f"Final Score: {score}", 32, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
-             pygame.display.flip(); pygame.time.wait(2500)
-             return score
-        elif game_state == LEVEL_COMPLETE:
-             overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA); overlay.fill((0, 0, 0, 180)); screen.blit(overlay, (0,0))
-             draw_text(screen, "LEVEL COMPLETE!", 64, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 4, YELLOW)
-             final_level_score = score + LEVEL_BONUS
-             draw_text(screen, f"Level {level} Bonus: +{LEVEL_BONUS}", 28, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
-             pygame.display.flip(); pygame.time.wait(2000)
-             if final_level_score >= extra_life_threshold: ships += 1; print(f"Extra life from bonus! Ships: {ships}")
-             return game_loop(screen, clock, font_small, font_large, ship_icon_surf, start_level=level + 1, initial_score=final_level_score, start_ships=ships)
-        pygame.display.flip()
-    print("Game loop exited unexpectedly?"); return score
+                    restore_snapshot(sim, saved); renderer.set_caption(f"PyThrust - Level {sim.level}"); renderer.invalidate()
+                    accumulator = 0.0; fire_pressed = False
+        profiler.mark("events"); accumulator += frame_time
+        held_inputs = read_input_bits(pygame.key.get_pressed()); profiler.mark("input")
+        while accumulator >= SIM_DT and sim.state not in (GAME_OVER, LEVEL_COMPLETE):
+            if replay_inputs is None: bits = held_inputs | (INPUT_FIRE if fire_pressed else 0); fire_pressed = False
+            else:
+                bits = next(replay_inputs, None)
+                if bits is None: return sim.score
+            sim.step(bits); accumulator -= SIM_DT
+            if recorder is not None: recorder.record(bits)
+            if streamer is not None: streamer.publish(sim)
+        dirty_rects = renderer.draw(sim, accumulator / SIM_DT)
+        if sim.state == GAME_OVER:
+             renderer.show_message("GAME OVER", RED, f"Final Score: {sim.score}", 32)
+             overlay_until = pygame.time.get_ticks() + GAME_OVER_DURATION
+        elif sim.state == LEVEL_COMPLETE:
+             renderer.show_message("LEVEL COMPLETE!", YELLOW, f"Level {sim.level} Bonus: +{LEVEL_BONUS}", 28)
+             overlay_until = pygame.time.get_ticks() + LEVEL_COMPLETE_DURATION
+        else: renderer.present(dirty_rects)
+        profiler.mark("flip"); profiler.end_frame(len(sim.all_sprites), len(sim.particles) if sim.particles is not None else 0)
+    log.warning("Game loop exited unexpectedly"); return sim.score
 
 # --- Main Execution Function ---
-def main():
+def window_size(text):
+    try: width, height = (int(part) for part in text.lower().split("x"))
+    except ValueError: raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {text!r}")
+    if width <= 0 or height <= 0: raise argparse.ArgumentTypeError(f"window size must be positive, got {text!r}")
+    return width, height
+
+def world_screens(text):
+    try: screens = int(text)
+    except ValueError: raise argparse.ArgumentTypeError(f"expected a number of screens, got {text!r}")
+    if not 0 < screens <= MAX_WORLD_SCREENS: raise argparse.ArgumentTypeError(f"world must be 1 to {MAX_WORLD_SCREENS} screens wide, got {text!r}")
+    return screens
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PyThrust II")
+    parser.add_argument("--headless", action="store_true", help="run the simulation without a window and report steps per second")
+    parser.add_argument("--level", type=int, default=1, help="level to simulate in headless mode")
+    parser.add_argument("--steps", type=int, default=SIM_HZ * 60, help="maximum ticks to simulate in headless mode")
+    parser.add_argument("--policy", choices=("idle", "random"), default="random", help="input policy for headless mode")
+    parser.add_argument("--seed", type=int, help="random seed")
+    parser.add_argument("--world", type=world_screens, metavar="SCREENS", help="play scrolling levels SCREENS screens wide with hilly terrain")
+    parser.add_argument("--full-redraw", action="store_true", help="redraw and flip the whole screen every frame instead of dirty rects")
+    parser.add_argument("--renderer", choices=("software", "sdl2"), default="software", help="draw with surface blits or with SDL2 textures (GPU when available)")
+    parser.add_argument("--window-size", type=window_size, default=(SCREEN_WIDTH, SCREEN_HEIGHT), metavar="WxH", help="window size for --renderer sdl2; the game is scaled to fit")
+    parser.add_argument("--record", metavar="PATH", help="save the seed and per-tick inputs of the last game played")
+    parser.add_argument("--replay", metavar="PATH", help="play back a recording (as fast as possible with --headless) and check it reproduces")
+    parser.add_argument("--resume", action="store_true", help=f"start the first game from the last F5 save ({SAVE_FILE})")
+    parser.add_argument("--stream", type=int, nargs="?", const=STREAM_PORT, metavar="PORT", help=f"let spectators follow the game on a local port (default {STREAM_PORT})")
+    parser.add_argument("--spectate", type=int, nargs="?", const=STREAM_PORT, metavar="PORT", help="watch a game running with --stream")
+    parser.add_argument("--profile-csv", metavar="PATH", help="write per-frame phase timings to a CSV file")
+    parser.add_argument("--startup-probe", action="store_true", help="exit as soon as the first menu frame is on screen (for timing cold starts)")
+    parser.add_argument("--log-level", choices=("debug", "info", "warning", "error"), default="warning", help="logging verbosity")
+    args = parser.parse_args(argv)
+    if args.resume and (args.record or args.replay): parser.error("--resume can't be combined with --record or --replay")
+    return args
+
+def report_replay(replay, sim, elapsed=None):
+    problems = check_replay(replay, sim); timing = f" in {elapsed:.3f}s ({sim.tick / max(elapsed, 1e-9):.0f} steps/s)" if elapsed is not None else ""
+    print(f"Replay: {sim.tick} steps{timing}, level {sim.level}, state {sim.state}, score {sim.score}, hash {state_hash(sim).hex()}: "
+          + ("MISMATCH (" + "; ".join(problems) + ")" if problems else "OK"))
+    return 1 if problems else 0
+
+def main_headless(args):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy"); pygame.init()
+    if args.replay:
+        replay = load_replay(args.replay)
+        start = time.perf_counter(); sim = replay_simulation(replay); elapsed = time.perf_counter() - start
+        pygame.quit(); return report_replay(replay, sim, elapsed)
+    if args.seed is not None: random.seed(args.seed)
+    policy = random_policy(args.seed) if args.policy == "random" else None
+    start = time.perf_counter(); sim = run_headless(args.level, args.steps, policy, seed=args.seed, world_screens=args.world); elapsed = time.perf_counter() - start
+    print(f"Level {sim.level}: {sim.tick} steps in {elapsed:.3f}s ({sim.tick / max(elapsed, 1e-9):.0f} steps/s), "
+          f"state {sim.state}, score {sim.score}, ships {sim.ships}")
+    pygame.quit()
+
+def main(argv=None):
     """Main function to handle menu and game execution."""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s %(name)s: %(message)s")
+    if args.headless: return main_headless(args)
+    resume = None
+    if args.resume:
+        try: resume = load_snapshot()
+        except (OSError, ValueError) as e: log.error("Can't resume from %s: %s", SAVE_FILE, e); return 1
     pygame.init(); pygame.font.init()
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    pygame.display.set_caption("PyThrust II"); clock = pygame.time.Clock()
-    font_small = pygame.font.Font(pygame.font.match_font('arial'), 18)
-    font_large = pygame.font.Font(pygame.font.match_font('arial'), 48)
+    if args.renderer == "sdl2":
+        try: backend = TextureBackend(args.window_size)
+        except ImportError as e: log.error("--renderer sdl2 needs pygame's SDL2 video module, which this pygame doesn't have (%s)", e); pygame.quit(); return 1
+        screen = backend.screen; present = backend.present_screen
+    else:
+        backend = None; screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT)); present = pygame.display.flip
+        pygame.display.set_caption("PyThrust II")
+    clock = pygame.time.Clock()
+    # Rotation atlases and level surfaces are built when a game starts, not before the menu.
+    font_small = get_font(18); font_large = get_font(48)
+    if args.startup_probe:
+        show_menu(screen, clock, font_small, font_large, load_high_scores(), -1, max_frames=1, present=present)
+        log.info("First menu frame %.0f ms after imports", (time.perf_counter() - STARTED_AT) * 1000)
+        if backend is not None: backend.close()
+        pygame.quit(); return 0
     ship_icon_surf = pygame.Surface([10, 8], pygame.SRCALPHA)
     pygame.draw.polygon(ship_icon_surf, WHITE, [(10, 4), (0, 0), (0, 7)])
-    high_scores = load_high_scores(); last_score = -1
+    if args.spectate is not None:
+        code = spectate(screen, clock, ship_icon_surf, args.spectate, args.full_redraw, backend)
+        if backend is not None: backend.close()
+        pygame.quit(); return code
+    streamer = None
+    if args.stream is not None:
+        try: streamer = SnapshotStreamer(args.stream); log.info("Streaming to spectators on port %d", streamer.port)
+        except OSError as e: log.error("Can't stream on port %d: %s", args.stream, e)
+    high_scores = load_high_scores(); last_score = -1; score_writer = HighScoreWriter(); save_writer = BackgroundWriter(SAVE_FILE, save_snapshot, "save-writer")
+    profiler = FrameProfiler(csv_path=args.profile_csv); recorder = InputRecorder() if args.record or args.replay else None
+    if args.replay:
+        replay = load_replay(args.replay); level_cache = LevelCache(replay.seed, world_screens=replay.world or None)
+        game_loop(screen, clock, font_small, font_large, ship_icon_surf, level_cache=level_cache, full_redraw=args.full_redraw,
+                  profiler=profiler, recorder=recorder, replay=replay, backend=backend, streamer=streamer)
+        level_cache.close(); profiler.close(); score_writer.close(); save_writer.close()
+        if streamer is not None: streamer.close()
+        if backend is not None: backend.close()
+        pygame.quit()
+        # Quitting early leaves ticks unplayed, which report_replay flags as a mismatch.
+        return report_replay(replay, recorder.sim)
     running = True
     while running:
-        action = show_menu(screen, clock, font_small, font_large, high_scores, last_score)
+        action = show_menu(screen, clock, font_small, font_large, high_scores, last_score, present=present)
         if action == 'QUIT': running = False
         elif action == 'START':
+            header = snapshot_header(resume) if resume else None; start_level = header.level if header else 1
+            level_cache = LevelCache(header.seed, world_screens=header.world or None) if header else LevelCache(random.getrandbits(32), world_screens=args.world)
+            level_cache.prefetch(start_level)
             final_score = game_loop(screen, clock, font_small, font_large, ship_icon_surf,
-                                     start_level=1, initial_score=0, start_ships=INITIAL_SHIPS)
-            last_score = final_score; print(f"Game finished with score: {last_score}")
-            high_scores = add_high_score(last_score, high_scores); print(f"High scores: {high_scores}")
+                                     start_level=start_level, initial_score=0, start_ships=INITIAL_SHIPS, level_cache=level_cache,
+                                     full_redraw=args.full_redraw, profiler=profiler, recorder=recorder, backend=backend,
+                                     streamer=streamer, save_writer=save_writer, snapshot=resume)
+            level_cache.close(); resume = None
+            if args.record: save_replay(recorder.replay(), args.record); log.info("Recorded %d ticks to %s", len(recorder.inputs), args.record)
+            last_score = final_score; log.info("Game finished with score %d", last_score)
+            high_scores = add_high_score(last_score, high_scores, score_writer); log.info("High scores: %s", high_scores)
+    profiler.close(); score_writer.close(); save_writer.close()
+    if streamer is not None: streamer.close()
+    if backend is not None: backend.close()
     pygame.quit(); sys.exit()
 
 # --- Start Game ---
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -1,5 +1,21 @@
 # -*- mode: python ; coding: utf-8 -*-
+# Build profiles, picked with the PYTHRUST_BUILD environment variable:
+#   onefile (default)  a single exe; unpacks itself to a temp dir on every launch
+#   startup            a folder with the exe next to its libraries; nothing to unpack, so it starts fastest
+import os
 
+profile = os.environ.get('PYTHRUST_BUILD', 'onefile')
+if profile not in ('onefile', 'startup'): raise SystemExit(f"PYTHRUST_BUILD must be 'onefile' or 'startup', not {profile!r}")
+
+# Pulled in by the stdlib, setuptools and numpy's build/test helpers but never imported by the game
+# (see build/thrust/warn-thrust.txt and xref-thrust.html). numpy, multiprocessing, concurrent, logging
+# and socket stay: the game uses them.
+excludes = [
+    'tkinter', 'unittest', 'doctest', 'pydoc', 'pydoc_data', 'pdb', 'bdb',
+    'asyncio', 'email', 'http', 'xml', 'xmlrpc', 'html', 'ftplib',
+    'distutils', 'setuptools', 'pkg_resources', 'packaging', 'numpy.f2py', 'numpy.distutils',
+    'pygame.examples', 'pygame.tests', 'pygame.docs',
+]
 
 a = Analysis(
     ['thrust.py'],
@@ -10,29 +26,58 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=excludes,
     noarchive=False,
-    optimize=0,
+    optimize=1,
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='thrust',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+# UPX saves disk space but every launch pays to decompress the libraries again.
+if profile == 'onefile':
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='thrust',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='thrust',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        name='thrust',
+    )